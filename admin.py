@@ -0,0 +1,143 @@
+import streamlit as st
+
+import diagnostics
+from backup import (
+    BACKUP_INTERVAL_HOURS, BACKUP_KEEP, BACKUP_PAGES_PER_STEP,
+    BackupFailed, backup_dir, backup_now, last_backup, list_backups, seconds_until_due
+)
+from services import barcode_cleanups, mark_barcode_cleanups_reviewed
+from writer import writer_stats
+
+
+# ==============================
+# 🩺 DIAGNOSTICS
+# ==============================
+def diagnostics_screen():
+    st.subheader("🩺 Diagnostics")
+
+    data = diagnostics.snapshot()
+    st.caption(
+        f"Counters since {data['since']} (this server process). "
+        f"Queries slower than {data['slow_query_ms']} ms are logged with their query plan."
+    )
+
+    cleanups = barcode_cleanups()
+    if cleanups:
+        st.markdown("### 🏷️ Duplicate barcodes cleared at upgrade")
+        st.warning(
+            f"{len(cleanups)} medicine(s) shared a barcode with an older medicine and had it removed, "
+            "so scanning now finds only the older one. Check each one and correct its barcode in the database."
+        )
+        st.dataframe(
+            {
+                "Medicine id": [r[0] for r in cleanups],
+                "Medicine": [f"{r[1]} {r[2] or ''}".strip() for r in cleanups],
+                "Barcode removed": [r[3] for r in cleanups],
+                "Kept by medicine id": [r[4] for r in cleanups],
+                "Cleared at (UTC)": [r[5] for r in cleanups],
+            },
+            hide_index=True,
+        )
+        if st.button("✔ Mark as reviewed"):
+            mark_barcode_cleanups_reviewed()
+            st.rerun()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("SQL statements", sum(q["calls"] for q in data["queries"]))
+    col2.metric("SQL time (ms)", f"{sum(q['total_ms'] for q in data['queries']):,.0f}")
+    col3.metric("Slow queries", len(data["slow_queries"]))
+
+    st.markdown("### ⏱️ Screens")
+    if data["renders"]:
+        st.dataframe(data["renders"], width="stretch", hide_index=True)
+    else:
+        st.info("No screens rendered yet.")
+
+    st.markdown("### 🗄️ Queries (by total time)")
+    st.dataframe(data["queries"][:100], width="stretch", hide_index=True)
+
+    st.markdown("### 🐢 Slow queries")
+    if data["slow_queries"]:
+        for entry in data["slow_queries"][:20]:
+            with st.expander(f"{entry['ms']} ms at {entry['at']} — {entry['sql'][:80]}"):
+                st.code(entry["sql"], language="sql")
+                st.caption(f"Parameters: {entry['params']}")
+                st.code(entry["plan"] or "(empty plan)")
+    else:
+        st.success("No slow queries recorded.")
+
+    st.markdown("### 🔢 Counters")
+    st.dataframe(data["counters"], width="stretch", hide_index=True)
+    writes = writer_stats()
+    st.caption(f"Group-commit writer: {writes['commands']} command(s) in {writes['groups']} commit(s).")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            "⬇️ Export JSON",
+            diagnostics.export_json(),
+            file_name=f"diagnostics_{data['exported_at'].replace(' ', '_').replace(':', '')}.json",
+            mime="application/json"
+        )
+    with col2:
+        st.download_button(
+            "⬇️ Export queries CSV",
+            diagnostics.export_queries_csv(),
+            file_name="diagnostics_queries.csv",
+            mime="text/csv"
+        )
+    with col3:
+        if st.button("🔄 Reset counters"):
+            diagnostics.reset()
+            st.rerun()
+
+
+# ==============================
+# 💾 BACKUPS
+# ==============================
+def backup_screen():
+    st.subheader("💾 Backups")
+    st.caption(
+        f"Online snapshots in {backup_dir()}, copied {BACKUP_PAGES_PER_STEP} pages at a time "
+        f"while tills keep selling. One is taken every {BACKUP_INTERVAL_HOURS} h; "
+        f"the newest {BACKUP_KEEP} are kept. Each is checked with PRAGMA integrity_check."
+    )
+
+    if last_backup and not last_backup["ok"]:
+        st.error(f"Last backup failed at {last_backup['at']:%Y-%m-%d %H:%M} UTC: {last_backup['error']}")
+
+    if st.button("💾 Back up now"):
+        bar = st.progress(0.0, text="Starting backup...")
+        try:
+            backup = backup_now(
+                lambda name, done, total: bar.progress(done / total if total else 1.0, text=f"{name}: {done:,}/{total:,} pages")
+            )
+        except BackupFailed as e:
+            st.error(str(e))
+        else:
+            bar.empty()
+            st.success(f"Snapshot {backup['name']} saved and verified ({backup['bytes'] / 1024 / 1024:,.1f} MiB).")
+
+    backups = list_backups()
+    if not backups:
+        st.info("No backups yet.")
+        return
+
+    due = seconds_until_due()
+    st.caption(f"Next scheduled backup in about {due / 3600:.1f} h." if due else "A scheduled backup is due now.")
+    st.dataframe(
+        [
+            {
+                "Snapshot": b["name"],
+                "Taken (UTC)": b["at"].strftime("%Y-%m-%d %H:%M:%S"),
+                "Size (MiB)": round(b["bytes"] / 1024 / 1024, 1),
+                "Files": ", ".join(b["files"]),
+            }
+            for b in backups
+        ],
+        width="stretch", hide_index=True
+    )
+    st.info(
+        "To restore, stop the app, delete any leftover i_dawa.db-wal and i_dawa.db-shm "
+        "in the data folder, then copy the snapshot's files into it."
+    )
@@ -1,12 +1,15 @@
 # ai_assistant.py
 import streamlit as st
 from database import get_connection
-from datetime import datetime, timedelta
-import difflib
+from catalog import get_catalog
+from fuzzy import fuzzy_matches
+from sales_counter import today_total
+from search import search_medicines
+from services import low_stock
+from snapshot import reporting_connection
+from utils.expiry import NEAR_EXPIRY_DAYS, expiring_within
 import re
 
-NEAR_EXPIRY_DAYS = 30
-
 
 # ======================================================
 # Optional Speech
@@ -21,66 +24,26 @@ except Exception:
 # ======================================================
 # ---------------- DATABASE HELPERS --------------------
 # ======================================================
-def get_all_medicine_names(conn):
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM medicines")
-    return [r[0] for r in cur.fetchall()]
+def get_all_medicine_names(conn=None):
+    # Served from the shared catalog cache; conn kept for existing callers
+    return get_catalog().names
 
 
 def search_medicine(query, conn):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT name, strength, units_in_stock, expiry_date, batch_no
-        FROM medicines
-        WHERE LOWER(name) LIKE ? OR LOWER(batch_no) LIKE ?
-    """, (f"%{query.lower()}%", f"%{query.lower()}%"))
-    return cur.fetchall()
-
-
-def get_low_stock(conn):
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT name, units_in_stock
-        FROM medicines
-        WHERE units_in_stock < 10
-    """)
-    return cur.fetchall()
-
-
-def get_today_sales(conn):
-    today = datetime.today().strftime("%Y-%m-%d")
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT SUM(total_price)
-        FROM sales
-        WHERE date LIKE ?
-    """, (f"{today}%",))
-    total = cur.fetchone()[0] or 0
-    return total
-
-
-def expiry_report(conn):
-    today = datetime.today().date()
-    limit = today + timedelta(days=NEAR_EXPIRY_DAYS)
+    return search_medicines(
+        conn, query,
+        columns="name, strength, units_in_stock, expiry_date, batch_no",
+        limit=20
+    )
 
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT name, expiry_date
-        FROM medicines
-        WHERE expiry_date IS NOT NULL
-    """)
 
-    expiring = []
+def get_low_stock(conn=None):
+    # At or below the forecast reorder point; conn kept for existing callers
+    return [(name, units, cover) for name, _, units, _, _, cover in low_stock()]
 
-    for name, expiry in cur.fetchall():
-        try:
-            exp = datetime.strptime(expiry, "%Y-%m-%d").date()
-            if exp <= limit:
-                expiring.append((name, expiry))
-        except:
-            pass
 
-    return expiring
+def expiry_report(conn):
+    return expiring_within(conn, NEAR_EXPIRY_DAYS, columns="name, expiry_iso")
 
 
 # ======================================================
@@ -147,8 +110,9 @@ def format_low_stock(results):
         return "✅ All medicines sufficiently stocked."
 
     msg = "📉 **Low Stock Medicines:**\n\n"
-    for n, stock in results:
-        msg += f"- {n} → {stock} left\n"
+    for n, stock, cover in results:
+        days = f" (~{cover:g} days)" if cover is not None else ""
+        msg += f"- {n} → {stock} left{days}\n"
     return msg
 
 
@@ -186,15 +150,17 @@ def process_ai_query(query):
 
     # ---------- EXPIRY ----------
     if intent == "expiry":
+        conn.close()
+        conn, _ = reporting_connection()
         res = expiry_report(conn)
         conn.close()
         return format_expiry(res)
 
     # ---------- TODAY SALES ----------
     if intent == "sales_today":
-        total = get_today_sales(conn)
         conn.close()
-        return f"💰 Today's sales total: **KSh {total:,.0f}**"
+        transactions, total = today_total()
+        return f"💰 Today's sales total: **KSh {total:,.0f}** ({transactions} transactions)"
 
     # ---------- INVENTORY ----------
     if intent == "inventory":
@@ -210,12 +176,21 @@ def process_ai_query(query):
         return format_medicine(results)
 
     # ---------- SUGGEST ----------
-    names = get_all_medicine_names(conn)
     conn.close()
 
-    suggestion = difflib.get_close_matches(query, names, n=1, cutoff=0.5)
-    if suggestion:
-        return f"🤔 Did you mean **{suggestion[0]}** ?"
+    # Trigram index over names, batches and barcodes (fuzzy.py)
+    suggestions = fuzzy_matches(query, k=3)
+    if suggestions:
+        # Name + strength so "Paracetamol 500mg" and "Paracetamol 1g" read apart
+        catalog = get_catalog()
+        labels = []
+        for medicine_id, name, _, _ in suggestions:
+            item = catalog.get(medicine_id)
+            strength = item.strength if item else None
+            label = f"**{name} {strength}**" if strength else f"**{name}**"
+            if label not in labels:
+                labels.append(label)
+        return "🤔 Did you mean " + " or ".join(labels) + " ?"
 
     return "❌ Drug not found. Try typing full name or say 'help'."
 
@@ -256,9 +231,7 @@ def render_ai_fab():
     st.divider()
     st.subheader("🤖 Pharmacy Assistant")
 
-    conn = get_connection()
-    names = get_all_medicine_names(conn)
-    conn.close()
+    names = get_all_medicine_names()
 
     # ---------- AUTOSUGGEST DROPDOWN ----------
     query = st.selectbox(
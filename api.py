@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import services
+from cart import InsufficientStock
+from database import DatabaseBusy, init_db
+from snapshot import current_as_of
+from stock import StockConflict
+from writer import WriterStopped
+
+# ======================================================
+# Local HTTP / JSON API for scanners and headless tills
+# ------------------------------------------------------
+# A thin layer over services.py on the standard-library threaded HTTP
+# server: one thread per connection, keep-alive enabled, so a scanner
+# can look up a barcode or ring up a sale in a few milliseconds without a
+# Streamlit rerun. Reads are served from the shared catalog cache; sales
+# and deliveries go through the same group-commit writer (writer.py),
+# pricing and stock rules as the screens.
+#
+#   python api.py --host 0.0.0.0 --port 8765
+#
+# A 504 with "outcome_unknown": true means a sale or delivery was handed
+# to the writer but not confirmed; check /receipts/latest before retrying.
+#
+# If IDAWA_API_TOKEN is set, every request must send
+# "Authorization: Bearer <token>".
+#
+#   GET  /health
+#   GET  /medicines?q=para&limit=20        GET  /medicines/<id>
+#   GET  /barcode/<barcode>                POST /medicines
+#   POST /sales      {"lines": [{"barcode" | "medicine_id", "quantity", "sale_type"?}]}
+#   POST /purchases  {"lines": [...], "supplier": "..."}
+#   GET  /reports/low-stock?threshold=10   GET  /reports/expiry?days=30
+#   GET  /reports/daily-sales?limit=30     GET  /reports/today
+#   GET  /receipts/latest
+# ======================================================
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1024 * 1024
+TOKEN_ENV = "IDAWA_API_TOKEN"
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _item(item):
+    return item._asdict()
+
+
+def _rows(rows, fields):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def _int_param(query, name, default):
+    if name not in query:
+        return default
+    try:
+        return int(query.get(name, [default])[0])
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer")
+
+
+# ==============================
+# 🔀 ROUTES
+# ==============================
+def health(query, body):
+    return {"status": "ok", "time": time.time()}
+
+
+def list_medicines(query, body):
+    limit = _int_param(query, "limit", 50)
+    items = services.find_medicines(query.get("q", [""])[0], limit)
+    return {"medicines": [_item(item) for item in items[:limit]]}
+
+
+def get_medicine(query, body, medicine_id):
+    return _item(services.get_medicine(int(medicine_id)))
+
+
+def get_barcode(query, body, barcode):
+    item = services.lookup_barcode(barcode)
+    if item is None:
+        raise ApiError(404, f"No medicine with barcode {barcode}")
+    return _item(item)
+
+
+def add_medicine(query, body):
+    fields = {
+        key: body[key] for key in (
+            "name", "strength", "form", "unit_type", "units_per_pack", "expiry_date",
+            "buy_price", "sell_price", "sale_policy", "barcode", "batch_no",
+        ) if key in body
+    }
+    return {"id": services.add_medicine(**fields)}
+
+
+def sell(query, body):
+    lines = body.get("lines")
+    if not lines:
+        raise ApiError(400, "lines is required")
+    return {"receipt_no": services.sell(lines)}
+
+
+def stock_in(query, body):
+    lines = body.get("lines")
+    if not lines:
+        raise ApiError(400, "lines is required")
+    return {"purchase_ids": services.stock_in(lines, body.get("supplier", ""))}
+
+
+def _as_of():
+    # Reports come from the reporting snapshot; null means live figures
+    as_of = current_as_of()
+    return as_of.isoformat(timespec="seconds") if as_of else None
+
+
+def low_stock(query, body):
+    # Forecast reorder points unless ?threshold= is given; always live figures
+    rows = services.low_stock(_int_param(query, "threshold", None), _int_param(query, "limit", None))
+    return {"as_of": None, "medicines": _rows(rows, (
+        "name", "strength", "units_in_stock", "reorder_point", "daily_demand", "days_of_cover"
+    ))}
+
+
+def expiry(query, body):
+    as_of = _as_of()
+    expired, lots, unreadable = services.expiring(_int_param(query, "days", 30))
+    return {
+        "as_of": as_of,
+        "expired": _rows(expired, ("name", "strength", "batch_no", "expiry", "units")),
+        "lots": _rows(lots, ("name", "strength", "batch_no", "expiry", "units")),
+        "unreadable": _rows(unreadable, ("name", "strength", "expiry_date")),
+    }
+
+
+def daily_sales(query, body):
+    as_of = _as_of()
+    rows = services.daily_sales(_int_param(query, "limit", 30))
+    return {"as_of": as_of, "days": _rows(rows, ("day", "transactions", "revenue"))}
+
+
+def today(query, body):
+    transactions, revenue = services.sales_today()
+    return {"transactions": transactions, "revenue": revenue}
+
+
+def latest_receipt(query, body):
+    receipt = services.latest_receipt()
+    if receipt is None:
+        raise ApiError(404, "No sales yet")
+    ref, date, lines = receipt
+    return {
+        "receipt": ref,
+        "date": date,
+        "lines": _rows(lines, ("name", "strength", "quantity", "sale_type", "total")),
+        "total": sum(line[4] for line in lines),
+    }
+
+
+ROUTES = [
+    ("GET", re.compile(r"^/health$"), health),
+    ("GET", re.compile(r"^/medicines$"), list_medicines),
+    ("GET", re.compile(r"^/medicines/(\d+)$"), get_medicine),
+    ("GET", re.compile(r"^/barcode/([^/]+)$"), get_barcode),
+    ("POST", re.compile(r"^/medicines$"), add_medicine),
+    ("POST", re.compile(r"^/sales$"), sell),
+    ("POST", re.compile(r"^/purchases$"), stock_in),
+    ("GET", re.compile(r"^/reports/low-stock$"), low_stock),
+    ("GET", re.compile(r"^/reports/expiry$"), expiry),
+    ("GET", re.compile(r"^/reports/daily-sales$"), daily_sales),
+    ("GET", re.compile(r"^/reports/today$"), today),
+    ("GET", re.compile(r"^/receipts/latest$"), latest_receipt),
+]
+
+
+# ==============================
+# 🌐 SERVER
+# ==============================
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive: a till reuses one connection for every request. Without
+    # TCP_NODELAY the separate header/body writes stall ~40 ms on Nagle.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    token = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Body is not valid JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "Body must be a JSON object")
+        return body
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        try:
+            if self.token and self.headers.get("Authorization") != f"Bearer {self.token}":
+                raise ApiError(401, "Missing or wrong API token")
+            body = self._read_body() if method == "POST" else {}
+
+            for route_method, pattern, handler in ROUTES:
+                match = pattern.match(url.path)
+                if match and route_method == method:
+                    result = handler(parse_qs(url.query), body, *match.groups())
+                    status = 201 if method == "POST" else 200
+                    break
+            else:
+                raise ApiError(404, f"No route for {method} {url.path}")
+
+        except ApiError as e:
+            status, result = e.status, {"error": str(e)}
+        except InsufficientStock as e:
+            status = 409
+            result = {"error": str(e), "shortages": [
+                {"medicine_id": mid, "label": label, "requested": req, "available": have}
+                for mid, label, req, have in e.shortages
+            ]}
+        except (services.DuplicateBarcode, StockConflict) as e:
+            status, result = 409, {"error": str(e)}
+        except services.UnknownMedicine as e:
+            status, result = 404, {"error": str(e)}
+        except DatabaseBusy as e:
+            status, result = 503, {"error": str(e)}
+        except (TimeoutError, WriterStopped) as e:
+            # The write may be queued or already committed: a blind retry could sell twice
+            status, result = 504, {
+                "error": f"Outcome unknown ({e or 'timed out'}): check /receipts/latest before retrying",
+                "outcome_unknown": True,
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            status, result = 400, {"error": f"Bad request: {e}"}
+        except Exception as e:
+            status, result = 500, {"error": f"Internal error: {e}"}
+
+        payload = json.dumps(result, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+    init_db()
+    handler = type("ConfiguredApiHandler", (ApiHandler,), {"token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="i_dawa JSON API for scanners and tills")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, os.environ.get(TOKEN_ENV))
+    print(f"i_dawa API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,5 +1,7 @@
 import streamlit as st
 from database import init_db
+from forecast import refresh_forecast
+from dashboard import dashboard_screen
 from inventory import inventory_screen
 from purchases import purchases_screen
 from sales import (
@@ -8,9 +10,13 @@ from sales import (
     sales_receipt_screen,
     daily_sales_report
 )
-from reports import low_stock_report, expiry_report
+from reports import low_stock_report, expiry_report, history_export
 from ai_assistant import render_ai_fab
-from utils.whatsapp_notifier import notify
+from admin import backup_screen, diagnostics_screen
+from backup import start_scheduler
+from diagnostics import render_timer
+from services import barcode_cleanups
+from utils.whatsapp_notifier import notify, start_worker
 
 # ---------------------------
 # LOGIN FUNCTION
@@ -28,11 +34,11 @@ def login_screen():
             st.session_state.logged_in = True
             st.session_state.username = name
 
-            # 🔔 WhatsApp notify on login
+            # 🔔 WhatsApp notify on login (queued; sent by the outbox worker)
             try:
                 notify(name, "Logged into Idawa Shop Demo")
             except Exception:
-                pass  # prevent crash if Twilio fails
+                pass  # never block login on notifications
 
             st.success(f"Welcome, {name}!")
             st.rerun()
@@ -45,6 +51,9 @@ def login_screen():
 # ---------------------------
 st.set_page_config(page_title="iDawa AI", layout="wide")
 init_db()
+start_worker()  # sends anything left in the outbox; no-op once running
+refresh_forecast()  # folds in yesterday's sales once a day; no-op otherwise
+start_scheduler()   # online backups every BACKUP_INTERVAL_HOURS; no-op once running
 
 # ---------------------------
 # AUTHENTICATION GATE
@@ -67,48 +76,65 @@ if "ai_open" not in st.session_state:
 # ---------------------------
 st.sidebar.write(f"👤 {st.session_state.username}")
 
+# Barcodes the upgrade took from duplicate medicines (migrations.py)
+if barcode_cleanups():
+    st.sidebar.warning("🏷️ Duplicate barcodes were cleared during the upgrade. Review them on Diagnostics.")
+
 if st.sidebar.button("Logout"):
     st.session_state.clear()
     st.rerun()
 
 menu = st.sidebar.radio(
     "Navigation",
-    ["Dashboard", "Inventory", "Purchases", "Sales", "Reports"]
+    ["Dashboard", "Inventory", "Purchases", "Sales", "Reports", "Diagnostics", "Backups"]
 )
 
 # ---------------------------
 # MAIN SCREEN ROUTER
 # ---------------------------
-if menu == "Dashboard":
-    st.subheader("📊 Dashboard")
-    st.info("Welcome to AI Pharmacy App")
-
-elif menu == "Inventory":
-    inventory_screen()
-
-elif menu == "Purchases":
-    purchases_screen()
-
-elif menu == "Sales":
+screen = menu
+if menu == "Sales":
     option = st.radio(
         "Sales Options",
         ["Quick Sale", "Dosage Sale", "Receipt", "Daily Report"]
     )
-    if option == "Quick Sale":
-        quick_sale_screen()
-    elif option == "Dosage Sale":
-        dosage_sale_screen()
-    elif option == "Receipt":
-        sales_receipt_screen()
-    elif option == "Daily Report":
-        daily_sales_report()
-
-elif menu == "Reports":
-    low_stock_report()
-    st.divider()
-    expiry_report()
+    screen = f"Sales / {option}"
+
+# Render time per screen, shown on the Diagnostics page
+with render_timer(screen):
+    if menu == "Dashboard":
+        dashboard_screen()
+
+    elif menu == "Inventory":
+        inventory_screen()
+
+    elif menu == "Purchases":
+        purchases_screen()
+
+    elif menu == "Sales":
+        if option == "Quick Sale":
+            quick_sale_screen()
+        elif option == "Dosage Sale":
+            dosage_sale_screen()
+        elif option == "Receipt":
+            sales_receipt_screen()
+        elif option == "Daily Report":
+            daily_sales_report()
+
+    elif menu == "Reports":
+        low_stock_report()
+        st.divider()
+        expiry_report()
+        st.divider()
+        history_export()
+
+    elif menu == "Diagnostics":
+        diagnostics_screen()
+
+    elif menu == "Backups":
+        backup_screen()
 
 # ---------------------------
 # GLOBAL AI (PERSISTENT)
-render_ai_fab()
-  
\ No newline at end of file
+with render_timer("AI assistant"):
+    render_ai_fab()
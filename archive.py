@@ -0,0 +1,242 @@
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import database
+from database import get_connection, init_db, with_busy_retry
+from diagnostics import timed
+from sales_counter import utc_today
+
+# ======================================================
+# Hot / cold history archive
+# ------------------------------------------------------
+# Sales and purchases older than ARCHIVE_AFTER_DAYS move to a second SQLite
+# file next to the main one (data/i_dawa_archive.db). They move in batches
+# of ARCHIVE_BATCH_ROWS with a short pause in between, so tills keep
+# getting the write lock. The hot file then holds only recent history.
+# Purchases whose stock lot still holds units stay hot.
+#
+# WAL commits are atomic per file only, so each batch is two transactions:
+# copy into the archive (INSERT OR IGNORE, so a rerun after a crash is
+# harmless), then delete the copied rows from the hot table and advance
+# archive_state.archived_before. Until the second one commits a row can
+# be in both files, and the history views skip archive rows still hot.
+#
+# read_history() ATTACHes the archive only when the requested range starts
+# before archived_before, and reads through a temporary UNION ALL view
+# (sales_history / purchases_history); otherwise it reads the hot table
+# alone. The daily_sales_summary rollup keeps archived days (rollups.py).
+#
+#   python archive.py --days 365 [--vacuum]
+# ======================================================
+
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_ROWS = 2000
+ARCHIVE_PAUSE_SECONDS = 0.05
+
+# kind -> (date column, extra condition on rows allowed to move)
+_ARCHIVED = {
+    "sales": ("sale_date", ""),
+    "purchases": ("purchase_date", """
+        AND id NOT IN (
+            SELECT purchase_id FROM main.stock_lots
+            WHERE qty_remaining > 0 AND purchase_id IS NOT NULL
+        )
+    """),
+}
+
+
+def archive_path():
+    return os.path.splitext(database.DB_PATH)[0] + "_archive.db"
+
+
+def _columns(conn, schema, table):
+    return [(row[1], row[2]) for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def attach_archive(conn, create=False):
+    # ATTACHes the archive as "archive" and (re)creates the <kind>_history
+    # views; False when there is no archive yet. Must run outside a transaction.
+    if not create and not os.path.exists(archive_path()):
+        return False
+
+    if "archive" not in {row[1] for row in conn.execute("PRAGMA database_list")}:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path(),))
+        conn.execute("PRAGMA archive.journal_mode = WAL")
+        conn.execute("PRAGMA archive.synchronous = NORMAL")
+
+    for kind, (date_column, _) in _ARCHIVED.items():
+        hot = _columns(conn, "main", kind)
+        cold = {name for name, _ in _columns(conn, "archive", kind)}
+        if not cold:
+            conn.execute(f"""
+                CREATE TABLE archive.{kind} ({", ".join(
+                    "id INTEGER PRIMARY KEY" if name == "id" else f"{name} {type_}" for name, type_ in hot
+                )})
+            """)
+            conn.execute(f"CREATE INDEX archive.idx_{kind}_date ON {kind}({date_column})")
+        else:
+            # Columns added to the hot table by later migrations
+            for name, type_ in hot:
+                if name not in cold:
+                    conn.execute(f"ALTER TABLE archive.{kind} ADD COLUMN {name} {type_}")
+
+        columns = ", ".join(name for name, _ in hot)
+        conn.execute(f"DROP VIEW IF EXISTS temp.{kind}_history")
+        conn.execute(f"""
+            CREATE TEMP VIEW {kind}_history AS
+            SELECT {columns} FROM main.{kind}
+            UNION ALL
+            SELECT {columns} FROM archive.{kind} a
+            WHERE NOT EXISTS (SELECT 1 FROM main.{kind} h WHERE h.id = a.id)
+        """)
+    return True
+
+
+def detach_archive(conn):
+    if "archive" not in {row[1] for row in conn.execute("PRAGMA database_list")}:
+        return
+    for kind in _ARCHIVED:
+        conn.execute(f"DROP VIEW IF EXISTS temp.{kind}_history")
+    conn.execute("DETACH DATABASE archive")
+
+
+def archived_before(conn, kind):
+    # 'YYYY-MM-DD': rows dated before it may be in the archive; None if never archived
+    row = conn.execute(
+        "SELECT archived_before FROM archive_state WHERE table_name = ?", (kind,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+# ==============================
+# 📖 READING
+# ==============================
+@contextmanager
+def read_history(kind, start=None):
+    # One read snapshot of sales or purchases from `start` ('YYYY-MM-DD', None
+    # for everything). Yields (conn, source) where source is the hot table,
+    # or <kind>_history when the range reaches archived rows.
+    conn = get_connection()
+    attached = False
+    try:
+        while True:
+            conn.execute("BEGIN")
+            boundary = archived_before(conn, kind)
+            if boundary is None or (start is not None and start >= boundary):
+                source = kind
+                break
+            if attached:
+                source = f"{kind}_history"
+                break
+            # ATTACH is not allowed inside a transaction; take a new snapshot after it
+            conn.rollback()
+            attached = attach_archive(conn, create=True)
+        yield conn, source
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if attached:
+            detach_archive(conn)
+        conn.close()
+
+
+# ==============================
+# 📦 ARCHIVING
+# ==============================
+def _move_batch(conn, kind, cutoff, batch_rows):
+    # Returns the number of rows moved; 0 when nothing older than cutoff is left
+    date_column, keep = _ARCHIVED[kind]
+    columns = ", ".join(name for name, _ in _columns(conn, "main", kind))
+    eligible = f"FROM main.{kind} WHERE {date_column} < ? {keep}"
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ids = [row[0] for row in conn.execute(
+            f"SELECT id {eligible} ORDER BY id LIMIT ?", (cutoff, batch_rows)
+        ).fetchall()]
+        if not ids:
+            conn.rollback()
+            return 0
+        low, high = ids[0], ids[-1]
+        conn.execute(f"""
+            INSERT OR IGNORE INTO archive.{kind} ({columns})
+            SELECT {columns} {eligible} AND id BETWEEN ? AND ?
+        """, (cutoff, low, high))
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        moved = conn.execute(f"""
+            DELETE FROM main.{kind}
+            WHERE id BETWEEN ? AND ?
+              AND id IN (SELECT id FROM archive.{kind} WHERE id BETWEEN ? AND ?)
+        """, (low, high, low, high)).rowcount
+        conn.execute("""
+            INSERT INTO archive_state (table_name, archived_before, archived_rows) VALUES (?, ?, ?)
+            ON CONFLICT (table_name) DO UPDATE SET
+                archived_before = MAX(archived_before, excluded.archived_before),
+                archived_rows = archived_rows + excluded.archived_rows,
+                updated_at = CURRENT_TIMESTAMP
+        """, (kind, cutoff, moved))
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    return moved
+
+
+def archive_history(days=ARCHIVE_AFTER_DAYS, batch_rows=ARCHIVE_BATCH_ROWS,
+                    pause=ARCHIVE_PAUSE_SECONDS, vacuum=False, today=None, on_batch=None):
+    # Moves sales / purchases dated before today - days; returns {kind: rows moved}
+    cutoff = ((today or utc_today()) - timedelta(days=days)).isoformat()
+    moved = dict.fromkeys(_ARCHIVED, 0)
+
+    conn = get_connection()
+    try:
+        attach_archive(conn, create=True)
+        for kind in _ARCHIVED:
+            while True:
+                with timed("archive.batch"):
+                    n = with_busy_retry(lambda: _move_batch(conn, kind, cutoff, batch_rows))
+                if not n:
+                    break
+                moved[kind] += n
+                if on_batch:
+                    on_batch(kind, moved[kind])
+                time.sleep(pause)
+
+        # Archiving leaves free pages behind; VACUUM shrinks the hot file
+        # but holds the write lock while it runs, so it is opt-in.
+        if vacuum and any(moved.values()):
+            conn.execute("VACUUM main")
+    finally:
+        detach_archive(conn)
+        conn.close()
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old sales and purchases to the archive database")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="keep this many days hot")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_ROWS, help="rows per batch")
+    parser.add_argument("--vacuum", action="store_true", help="shrink the hot file afterwards")
+    args = parser.parse_args()
+
+    init_db()
+    moved = archive_history(
+        args.days, args.batch, vacuum=args.vacuum,
+        on_batch=lambda kind, n: print(f"  {kind}: {n:,} rows", end="\r")
+    )
+    for kind, n in moved.items():
+        print(f"{kind}: {n:,} row(s) archived")
+    for path in (database.DB_PATH, archive_path()):
+        if os.path.exists(path):
+            print(f"{path}: {os.path.getsize(path) / 1024 / 1024:,.1f} MiB")
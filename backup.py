@@ -0,0 +1,255 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import database
+from archive import archive_path
+from diagnostics import count
+
+# ======================================================
+# Online backups
+# ------------------------------------------------------
+# backup_now() copies the live database with SQLite's backup API,
+# BACKUP_PAGES_PER_STEP pages at a time with a short sleep after each step.
+# A step holds a read lock only while it copies, and in WAL mode readers
+# never block writers, so tills keep committing during a backup. A write
+# from another connection makes SQLite restart the copy from the first
+# page; after BACKUP_MAX_RESTARTS restarts the rest is copied in a single
+# step from one snapshot, which does not block writers either.
+#
+# Each snapshot is a folder in data/backups named by its UTC time. It
+# holds i_dawa.db and the archive file, if there is one (archive.py). The
+# copy is written under a .partial name and checked with
+# PRAGMA integrity_check. Only then is it renamed. Every folder without
+# .partial is therefore a verified, self-contained copy (journal_mode
+# DELETE, no -wal file). The newest BACKUP_KEEP snapshots are kept.
+#
+# start_scheduler() takes one every BACKUP_INTERVAL_HOURS in a background
+# thread. The Backups page (admin.py) can start one at any time.
+#
+# Restore: stop the app, delete any leftover data/i_dawa.db-wal and
+# data/i_dawa.db-shm (SQLite would replay a stale -wal over the restored
+# file), then copy a snapshot's files into data/.
+#
+#   python backup.py [--list]
+# ======================================================
+
+BACKUP_KEEP = 14
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP_SECONDS = 0.005
+BACKUP_MAX_RESTARTS = 3
+BACKUP_INTERVAL_HOURS = 24
+BACKUP_RETRY_SECONDS = 15 * 60
+
+_STAMP = "%Y%m%d-%H%M%S"
+_PARTIAL = ".partial"
+
+_lock = threading.Lock()        # one backup at a time per process
+last_backup = {}                # outcome of the latest backup_now() in this process
+
+
+class BackupFailed(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_dir():
+    return os.path.join(os.path.dirname(database.DB_PATH) or ".", "backups")
+
+
+def copy_database(src_path, dst_path, on_progress=None):
+    # Online, paced copy into a self-contained file; returns how many times SQLite restarted it
+    src = sqlite3.connect(src_path, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    dst = sqlite3.connect(dst_path)
+    restarts = 0
+    previous = None
+
+    def progress(status, remaining, total):
+        nonlocal previous, restarts
+        if previous is not None and remaining > previous:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        previous = remaining
+        if on_progress:
+            on_progress(os.path.basename(src_path), total - remaining, total)
+        if remaining:
+            time.sleep(BACKUP_STEP_SLEEP_SECONDS)
+
+    try:
+        try:
+            src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=progress)
+        except _TooManyRestarts:
+            src.backup(dst)
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dst.close()
+        src.close()
+    return restarts
+
+
+def _integrity_problems(path):
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def list_backups():
+    # [{"name", "path", "at" (UTC datetime), "bytes", "files"}], newest first
+    root = backup_dir()
+    if not os.path.isdir(root):
+        return []
+
+    backups = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.endswith(_PARTIAL) or not os.path.isdir(path):
+            continue
+        try:
+            at = datetime.strptime(name[:15], _STAMP).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        files = sorted(os.listdir(path))
+        backups.append({
+            "name": name,
+            "path": path,
+            "at": at,
+            "bytes": sum(os.path.getsize(os.path.join(path, f)) for f in files),
+            "files": files,
+        })
+    backups.sort(key=lambda b: b["name"], reverse=True)
+    return backups
+
+
+def _rotate(keep=BACKUP_KEEP):
+    for old in list_backups()[keep:]:
+        shutil.rmtree(old["path"], ignore_errors=True)
+
+
+def backup_now(on_progress=None):
+    # Takes, verifies and rotates one snapshot; returns its list_backups() entry.
+    # on_progress(file name, pages done, pages total) is called after every step.
+    with _lock:
+        began = time.perf_counter()
+        root = backup_dir()
+        os.makedirs(root, exist_ok=True)
+
+        # Leftovers of a backup that was interrupted
+        for name in os.listdir(root):
+            if name.endswith(_PARTIAL):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+        name = datetime.now(timezone.utc).strftime(_STAMP)
+        suffix = 1
+        while os.path.exists(os.path.join(root, name)):
+            name = f"{datetime.now(timezone.utc).strftime(_STAMP)}-{suffix}"
+            suffix += 1
+        final = os.path.join(root, name)
+        partial = final + _PARTIAL
+        os.makedirs(partial)
+
+        sources = [database.DB_PATH]
+        if os.path.exists(archive_path()):
+            sources.append(archive_path())
+
+        restarts = 0
+        try:
+            for source in sources:
+                target = os.path.join(partial, os.path.basename(source))
+                restarts += copy_database(source, target, on_progress)
+                problems = _integrity_problems(target)
+                if problems:
+                    raise BackupFailed(f"{os.path.basename(source)} failed integrity_check: {problems[0]}")
+            os.replace(partial, final)
+        except Exception as e:
+            shutil.rmtree(partial, ignore_errors=True)
+            last_backup.update(at=datetime.now(timezone.utc), ok=False, error=str(e), name=None)
+            if isinstance(e, BackupFailed):
+                raise
+            raise BackupFailed(f"Backup failed: {e}") from e
+
+        elapsed = time.perf_counter() - began
+        count("backup.snapshot", elapsed * 1000)
+        last_backup.update(
+            at=datetime.now(timezone.utc), ok=True, error=None, name=name,
+            seconds=round(elapsed, 2), restarts=restarts,
+        )
+        _rotate()
+        return next(b for b in list_backups() if b["name"] == name)
+
+
+# ==============================
+# ⏰ SCHEDULE
+# ==============================
+def seconds_until_due():
+    backups = list_backups()
+    if not backups:
+        return 0
+    age = (datetime.now(timezone.utc) - backups[0]["at"]).total_seconds()
+    return max(0, BACKUP_INTERVAL_HOURS * 3600 - age)
+
+
+class BackupScheduler:
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Measured from the newest snapshot, so restarts do not add backups
+            wait = seconds_until_due()
+            if wait > 0:
+                self._stop.wait(min(wait, 3600))
+                continue
+            try:
+                backup_now()
+            except Exception:
+                self._stop.wait(BACKUP_RETRY_SECONDS)   # recorded in last_backup
+
+
+_scheduler = BackupScheduler()
+
+
+def start_scheduler():
+    _scheduler.start()
+
+
+def stop_scheduler(timeout=5):
+    _scheduler.stop(timeout)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up the database while the app is running")
+    parser.add_argument("--list", action="store_true", help="list snapshots instead of taking one")
+    args = parser.parse_args()
+
+    if not args.list:
+        database.init_db()
+        backup = backup_now(lambda name, done, total: print(f"  {name}: {done:,}/{total:,} pages", end="\r"))
+        print(f"{backup['path']}: {backup['bytes'] / 1024 / 1024:,.1f} MiB, verified")
+    for backup in list_backups():
+        print(f"{backup['name']}  {backup['bytes'] / 1024 / 1024:8,.1f} MiB  {', '.join(backup['files'])}")
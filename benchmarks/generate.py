@@ -0,0 +1,210 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import database
+from database import close_all, init_db, write_transaction
+
+# ======================================================
+# Synthetic pharmacy databases for benchmarking
+# ------------------------------------------------------
+# Builds a fully migrated database at a fixed scale with a seeded RNG, so
+# two runs of the same scale produce the same data. Stock goes in the way
+# the app stores it: one purchase and one stock lot per delivery, with
+# units_in_stock / expiry_date derived from the open lots. Sales go through
+# the normal INSERT, so the rollup trigger and indexes do their real work.
+#
+#   python -m benchmarks.generate --scale small
+# ======================================================
+
+# scale -> (medicines, sales rows, purchases / lots)
+SCALES = {
+    "small": (1_000, 100_000, 20_000),
+    "medium": (20_000, 1_000_000, 200_000),
+    "large": (200_000, 10_000_000, 2_000_000),
+}
+
+HISTORY_DAYS = 365
+BATCH_ROWS = 50_000
+
+_STEMS = [
+    "Paracetamol", "Amoxicillin", "Ibuprofen", "Metformin", "Amlodipine",
+    "Omeprazole", "Ciprofloxacin", "Azithromycin", "Cetirizine", "Loratadine",
+    "Diclofenac", "Metronidazole", "Salbutamol", "Prednisolone", "Losartan",
+    "Atorvastatin", "Fluconazole", "Doxycycline", "Ranitidine", "Albendazole",
+    "Artemether", "Lumefantrine", "Cotrimoxazole", "Hydrochlorothiazide", "Nifedipine",
+    "Glibenclamide", "Insulin", "Clotrimazole", "Erythromycin", "Ferrous",
+]
+_BRANDS = [
+    "", "Extra", "Forte", "Plus", "Junior", "Duo", "Retard", "SR", "DS", "Kids",
+    "Panadol", "Cosmos", "Dawa", "Beta", "Regal", "Elys", "Lab&Allied", "Universal",
+]
+_STRENGTHS = ["100mg", "125mg", "250mg", "400mg", "500mg", "5mg/ml", "10mg", "20mg", "1g"]
+_FORMS = [("Tablet", "tablet"), ("Capsule", "capsule"), ("Syrup", "ml"), ("Injection", "vial")]
+_POLICIES = ["OTC", "OTC", "OTC", "ADVICE", "PRESCRIPTION"]
+_SUPPLIERS = ["Dawa Ltd", "Cosmos", "Surgipharm", "Harleys", "Laborex", "Mission for Essential Drugs"]
+
+
+def _batches(rows, size=BATCH_ROWS):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _medicine_rows(rng, count):
+    today = date.today()
+    for i in range(1, count + 1):
+        # Names repeat across strengths and packs, as they do in real catalogs
+        name = f"{rng.choice(_STEMS)} {rng.choice(_BRANDS)}".strip()
+        form, unit_type = rng.choice(_FORMS)
+        buy = round(rng.uniform(2, 400), 2)
+        # The catalog expiry is only a fallback once every lot is sold out
+        expiry = (today + timedelta(days=rng.randint(-60, 900))).isoformat()
+        yield (
+            name, rng.choice(_STRENGTHS), form, unit_type, rng.choice([1, 10, 20, 30, 100]),
+            0, expiry, buy, round(buy * rng.uniform(1.2, 1.8), 2), rng.choice(_POLICIES),
+            f"B{i:07d}", f"6{i:012d}",
+        )
+
+
+def _purchase_rows(rng, count, medicines, start):
+    today = date.today()
+    for i in range(count):
+        received = start + timedelta(seconds=rng.randint(0, HISTORY_DAYS * 86400))
+        # Most deliveries expire well after receipt; a few are already past
+        expiry = (received.date() + timedelta(days=rng.randint(-30, 720))).isoformat()
+        qty = rng.randint(10, 500)
+        # Older deliveries have mostly been sold through; every twelfth
+        # medicine is nearly sold out so the low-stock paths have work to do
+        medicine_id = rng.randint(1, medicines)
+        age = (today - received.date()).days / HISTORY_DAYS
+        if medicine_id % 12 == 0:
+            remaining = rng.randint(0, 2)
+        else:
+            remaining = 0 if rng.random() < age else rng.randint(0, qty)
+        yield (
+            medicine_id, qty, round(rng.uniform(2, 400), 2),
+            rng.choice(_SUPPLIERS), expiry, f"LOT{i:08d}",
+            received.strftime("%Y-%m-%d %H:%M:%S"), remaining,
+        )
+
+
+def _sale_rows(rng, count, medicines, start):
+    # Receipts of 1-4 lines, timestamps in UTC like CURRENT_TIMESTAMP
+    written = 0
+    receipt = 0
+    while written < count:
+        receipt += 1
+        when = start + timedelta(seconds=rng.randint(0, HISTORY_DAYS * 86400))
+        stamp = when.strftime("%Y-%m-%d %H:%M:%S")
+        receipt_no = f"R{when:%Y%m%d%H%M%S}-{receipt:X}"
+        for _ in range(min(rng.randint(1, 4), count - written)):
+            qty = rng.randint(1, 30)
+            price = round(rng.uniform(5, 600), 2)
+            yield (
+                rng.randint(1, medicines), qty, rng.choice(("QUICK", "QUICK", "DOSAGE")),
+                round(qty * price, 2), stamp, receipt_no,
+            )
+            written += 1
+
+
+def generate(path, scale="small", seed=42, log=print):
+    medicines, sales, purchases = SCALES[scale]
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists; remove it to regenerate")
+
+    close_all()
+    database.DB_PATH = path
+    init_db()
+
+    rng = random.Random(seed)
+    start = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
+    began = time.perf_counter()
+
+    for batch in _batches(_medicine_rows(rng, medicines)):
+        with write_transaction() as conn:
+            conn.executemany("""
+                INSERT INTO medicines
+                (name, strength, form, unit_type, units_per_pack, units_in_stock, expiry_date,
+                 buy_price, sell_price, sale_policy, batch_no, barcode)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch)
+    log(f"medicines: {medicines:,}")
+
+    # Fresh database: purchase ids run 1..n in insert order
+    purchase_id = 0
+    for batch in _batches(_purchase_rows(rng, purchases, medicines, start)):
+        with write_transaction() as conn:
+            conn.executemany("""
+                INSERT INTO purchases
+                (medicine_id, quantity, buy_price, supplier, expiry_date, batch_no, purchase_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [row[:7] for row in batch])
+            lots = []
+            for row in batch:
+                purchase_id += 1
+                lots.append((row[0], row[5], row[4], row[7], purchase_id, row[6]))
+            conn.executemany("""
+                INSERT INTO stock_lots
+                (medicine_id, batch_no, expiry_iso, qty_remaining, purchase_id, received_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, lots)
+    log(f"purchases / lots: {purchases:,}")
+
+    with write_transaction() as conn:
+        conn.execute("""
+            UPDATE medicines
+            SET units_in_stock = COALESCE((
+                    SELECT SUM(qty_remaining) FROM stock_lots
+                    WHERE medicine_id = medicines.id
+                ), 0),
+                expiry_date = COALESCE((
+                    SELECT MIN(expiry_iso) FROM stock_lots
+                    WHERE medicine_id = medicines.id AND qty_remaining > 0
+                ), expiry_date)
+        """)
+
+    written = 0
+    for batch in _batches(_sale_rows(rng, sales, medicines, start)):
+        with write_transaction() as conn:
+            conn.executemany("""
+                INSERT INTO sales
+                (medicine_id, quantity, sale_type, total_price, sale_date, receipt_no)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, batch)
+        written += len(batch)
+        if written % (BATCH_ROWS * 20) == 0:
+            log(f"  sales: {written:,}")
+    log(f"sales: {sales:,}")
+
+    conn = database.get_connection()
+    conn.execute("ANALYZE")
+    conn.close()
+    close_all()
+
+    log(f"generated {path} ({scale}) in {time.perf_counter() - began:.1f}s")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic i_dawa database")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--out", help="database path (default: benchmarks/data/<scale>.db)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    out = args.out or os.path.join("benchmarks", "data", f"{args.scale}.db")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    try:
+        generate(out, args.scale, args.seed)
+    except FileExistsError as e:
+        print(e)
+        sys.exit(1)
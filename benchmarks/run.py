@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+import database
+from database import close_all, get_connection, init_db
+from benchmarks.generate import SCALES, generate
+from snapshot import refresh_snapshot
+
+# ======================================================
+# Benchmark suite
+# ------------------------------------------------------
+# Times the queries behind every screen and every assistant intent
+# against a synthetic database, headlessly (no Streamlit session). Each
+# case runs a few warm-up calls, then `iterations` timed calls; p50/p95
+# are reported in milliseconds and can be saved as a baseline or
+# compared against one:
+#
+#   python -m benchmarks.run --scale small --save-baseline benchmarks/baseline-small.json
+#   python -m benchmarks.run --scale small --baseline benchmarks/baseline-small.json
+#
+# A case regresses when its p95 is more than --tolerance slower than the
+# baseline; the run then exits with status 1. The checkout case writes
+# real sales into the benchmark database, so regenerate it now and then.
+# ======================================================
+
+WARMUP = 3
+ITERATIONS = 30
+TOLERANCE = 0.25
+
+_QUERIES = ["para", "amox", "ibupro", "metfor", "cetiri", "salbu", "insulin", "ferrous"]
+_TYPOS = ["amoxcilin", "paracetmol", "ibuprophen", "metfromin", "azithromicin"]
+_INTENTS = {
+    "low_stock": "what is running out",
+    "expiry": "what will expire soon",
+    "sales_today": "sales today",
+    "inventory": "show inventory",
+    "medicine": "panadol",
+    "fuzzy": None,      # a misspelt name, falls through to the trigram suggestions
+}
+
+
+# ======================================================
+# ---------------------- CASES -------------------------
+# ======================================================
+def _cases(rng):
+    # Imported here so the database path is set before any module caches
+    from ai_assistant import process_ai_query
+    from cart import checkout, make_line
+    from catalog import _load, get_catalog
+    from inventory import SORT_KEYS, count_inventory, fetch_inventory_page
+    from rollups import daily_totals
+    from services import latest_receipt, low_stock
+    from sales_counter import query_day_total, utc_today
+    from search import search_medicine_ids
+    from utils.expiry import expiring_within, unreadable_expiry
+
+    catalog = get_catalog()
+    barcodes = [item.barcode for item in catalog.items if item.barcode]
+    conn = get_connection()
+    stocked = {row[0] for row in conn.execute("""
+        SELECT DISTINCT medicine_id FROM stock_lots
+        WHERE qty_remaining > 0 AND (expiry_iso IS NULL OR expiry_iso >= date('now'))
+    """)}
+    conn.close()
+    sellable = [item for item in catalog.items if item.id in stocked]
+
+    def with_conn(fn):
+        def case():
+            conn = get_connection()
+            try:
+                return fn(conn)
+            finally:
+                conn.close()
+        return case
+
+    def middle_page(sort):
+        # Seek into the middle of the list, as paging forward does; the
+        # cursor is found once, outside the timed call
+        conn = get_connection()
+        key = conn.execute(
+            f"SELECT {SORT_KEYS[sort]}, id FROM medicines ORDER BY 1, 2 LIMIT 1 OFFSET ?",
+            (count_inventory(conn) // 2,)
+        ).fetchone()
+        conn.close()
+        return lambda c: fetch_inventory_page(c, sort, after=tuple(key) if key else None)
+
+    def quick_sale(conn):
+        ids = search_medicine_ids(conn, rng.choice(_QUERIES))
+        return [get_catalog().get(mid) for mid in ids]
+
+    def checkout_one():
+        item = rng.choice(sellable)
+        return checkout([make_line(item.id, item.name, 1, "QUICK", item.sell_price)])
+
+    cases = [
+        ("catalog.cold_load", lambda: _load(database.data_version())),
+        ("quick_sale.search", with_conn(quick_sale)),
+        ("quick_sale.barcode", with_conn(lambda c: search_medicine_ids(c, rng.choice(barcodes)))),
+        ("inventory.count", with_conn(count_inventory)),
+        ("inventory.first_page", with_conn(fetch_inventory_page)),
+        ("inventory.middle_page_by_expiry", with_conn(middle_page("Expiry"))),
+        ("inventory.filtered", with_conn(
+            lambda c: fetch_inventory_page(c, text=rng.choice(_QUERIES), policy="OTC"))),
+        ("reports.low_stock", lambda: low_stock(10)),
+        ("reports.reorder_points", low_stock),
+        ("reports.expiry_90d", with_conn(lambda c: (expiring_within(c, 90), unreadable_expiry(c)))),
+        ("sales.daily_report", with_conn(daily_totals)),
+        ("sales.today_total", with_conn(lambda c: query_day_total(c, utc_today()))),
+        ("sales.receipt", latest_receipt),
+    ]
+    for intent, text in _INTENTS.items():
+        cases.append((
+            f"assistant.{intent}",
+            lambda text=text: process_ai_query(text or rng.choice(_TYPOS)),
+        ))
+
+    # Writes last: each checkout bumps data_version and invalidates the caches
+    if sellable:
+        cases.append(("sales.checkout", checkout_one))
+    return cases
+
+
+# ======================================================
+# ---------------------- TIMING ------------------------
+# ======================================================
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    pos = (len(ordered) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def time_case(fn, iterations=ITERATIONS, warmup=WARMUP):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        began = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - began) * 1000)
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "n": iterations,
+    }
+
+
+def run(db_path, scale, iterations=ITERATIONS, only=None, seed=7, log=print):
+    close_all()
+    database.DB_PATH = db_path
+    init_db()
+    # Report cases read the reporting snapshot, as they do in the app
+    refresh_snapshot()
+
+    rng = random.Random(seed)
+    results = {}
+    for name, fn in _cases(rng):
+        if only and only not in name:
+            continue
+        results[name] = time_case(fn, iterations)
+        log(f"{name:<36} p50 {results[name]['p50_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms")
+
+    close_all()
+    return {
+        "scale": scale,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cases": results,
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    # [(case, baseline p95, current p95, ratio)] for cases slower than allowed
+    regressions = []
+    for name, current in report["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        ratio = current["p95_ms"] / before["p95_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, before["p95_ms"], current["p95_ms"], ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every screen's queries on synthetic data")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--db", help="database path (default: benchmarks/data/<scale>.db, generated if missing)")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="compare p95 against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join("benchmarks", "data", f"{args.scale}.db")
+    if not os.path.exists(db_path):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        generate(db_path, args.scale)
+
+    report = run(db_path, args.scale, args.iterations, args.only)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            print(f"warning: baseline is for scale {baseline.get('scale')!r}, not {args.scale!r}")
+        regressions = compare(report, baseline, args.tolerance)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: p95 {before:.2f} -> {after:.2f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against baseline")
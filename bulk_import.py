@@ -0,0 +1,363 @@
+import csv
+import io
+
+from catalog import get_catalog
+from database import write_transaction
+from stock import receive_stock
+from utils.expiry import EXPIRY_FORMATS, lot_expiry
+from writer import execute
+
+# ======================================================
+# Bulk stock-in from supplier delivery notes
+# ------------------------------------------------------
+# read_delivery()    -> raw rows (dicts) streamed from CSV / Excel
+# resolve_delivery() -> (valid lines, errors), resolved against the catalog
+# apply_delivery()   -> one write via stock.receive_stock(), through writer.py
+# ======================================================
+
+DELIVERY_COLUMNS = ("barcode", "name", "strength", "quantity", "buy_price", "expiry_date", "batch_no", "supplier")
+
+# Header spellings seen on wholesaler delivery notes
+_HEADER_ALIASES = {
+    "qty": "quantity",
+    "units": "quantity",
+    "unit_price": "buy_price",
+    "cost": "buy_price",
+    "price": "buy_price",
+    "expiry": "expiry_date",
+    "exp": "expiry_date",
+    "batch": "batch_no",
+    "lot": "batch_no",
+    "product": "name",
+    "description": "name",
+    "medicine": "name",
+    "ean": "barcode",
+    "code": "barcode",
+}
+
+
+def _canonical_header(header):
+    key = str(header or "").strip().lower().replace(" ", "_")
+    return _HEADER_ALIASES.get(key, key)
+
+
+def _is_excel(filename):
+    # .xlsx only: legacy .xls needs xlrd, which is not a dependency
+    return filename.lower().endswith(".xlsx")
+
+
+def read_delivery(file, filename):
+    # Yields one dict per non-empty line, keyed by DELIVERY_COLUMNS plus its file line number
+    if _is_excel(filename):
+        try:
+            import pandas as pd
+            frame = pd.read_excel(file, dtype=str)
+        except ImportError as e:
+            raise ValueError("Excel import needs pandas and openpyxl installed; upload a CSV instead.") from e
+
+        frame.columns = [_canonical_header(c) for c in frame.columns]
+        for index, record in enumerate(frame.fillna("").to_dict("records")):
+            row = {col: str(record.get(col, "")).strip() for col in DELIVERY_COLUMNS}
+            row["line_no"] = index + 2   # header is line 1
+            yield row
+        return
+
+    text = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = [_canonical_header(h) for h in next(reader, [])]
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        record = dict(zip(header, values))
+        row = {col: (record.get(col) or "").strip() for col in DELIVERY_COLUMNS}
+        row["line_no"] = reader.line_num
+        yield row
+
+
+def _match_key(text):
+    return " ".join(str(text or "").lower().split())
+
+
+def resolve_delivery(rows, default_supplier=""):
+    catalog = get_catalog()
+    # Several medicines can share a name (one per strength or form)
+    by_name = {}
+    for item in catalog.items:
+        by_name.setdefault(_match_key(item.name), []).append(item)
+
+    lines, errors = [], []
+    for row in rows:
+        line_no = row["line_no"]
+        item = catalog.by_barcode.get(row["barcode"]) if row["barcode"] else None
+        if item is None:
+            matches = by_name.get(_match_key(row["name"]), [])
+            if row["strength"]:
+                matches = [m for m in matches if _match_key(m.strength) == _match_key(row["strength"])]
+            if len(matches) > 1:
+                strengths = ", ".join(sorted({m.strength or "?" for m in matches}))
+                errors.append((line_no, f"{row['name']} matches {len(matches)} medicines "
+                                        f"({strengths}): give a barcode or strength"))
+                continue
+            item = matches[0] if matches else None
+        if item is None:
+            errors.append((line_no, f"Unknown medicine: {row['barcode'] or row['name'] or '(blank)'}"))
+            continue
+        medicine_id = item.id
+
+        try:
+            quantity = int(float(row["quantity"].replace(",", "")))
+        except (ValueError, OverflowError):
+            quantity = 0
+        if quantity <= 0:
+            errors.append((line_no, f"Invalid quantity: {row['quantity']!r}"))
+            continue
+
+        try:
+            buy_price = float(row["buy_price"].replace(",", "")) if row["buy_price"] else 0.0
+        except ValueError:
+            errors.append((line_no, f"Invalid buy price: {row['buy_price']!r}"))
+            continue
+        if buy_price < 0:
+            errors.append((line_no, f"Negative buy price: {row['buy_price']!r}"))
+            continue
+
+        try:
+            expiry = lot_expiry(row["expiry_date"])
+        except ValueError as e:
+            errors.append((line_no, str(e)))
+            continue
+
+        lines.append({
+            "line_no": line_no,
+            "medicine_id": medicine_id,
+            "name": catalog.get(medicine_id).name,
+            "quantity": quantity,
+            "buy_price": buy_price,
+            "expiry_date": expiry,
+            "batch_no": row["batch_no"] or None,
+            "supplier": row["supplier"] or default_supplier,
+        })
+
+    return lines, errors
+
+
+def apply_delivery(lines):
+    # Same path as services.stock_in and checkout: the group-commit writer
+    if not lines:
+        return 0
+
+    execute(lambda conn: receive_stock(conn, lines))
+    return len(lines)
+
+
+# ======================================================
+# Bulk catalog import / upsert
+# ------------------------------------------------------
+# Price lists are read in chunks with pandas and coerced column-wise (no
+# per-row Python). Each chunk looks its barcodes up once, then INSERTs the
+# new medicines and UPDATEs the known ones. A single ON CONFLICT upsert
+# cannot do this: new rows need a name and a default sale_policy, while
+# updates need neither. Stock levels are never touched here.
+#
+# An existing medicine only takes the cells the file fills in: missing or
+# blank columns keep their current value. Its expiry_date / batch_no follow
+# its stock lots (stock.py) and are never changed by a catalog import.
+#
+# A row without a barcode can only be told apart by name + strength. It is
+# added once and skipped (reported) when that pair already exists, so
+# re-running a file, or resuming one after a failed chunk, adds nothing twice.
+# ======================================================
+
+CATALOG_COLUMNS = (
+    "barcode", "name", "batch_no", "strength", "form", "unit_type",
+    "units_per_pack", "expiry_date", "buy_price", "sell_price", "sale_policy",
+)
+CATALOG_CHUNK_ROWS = 2000
+SALE_POLICIES = ("OTC", "ADVICE", "PRESCRIPTION")
+DEFAULT_SALE_POLICY = "OTC"     # new medicines only
+_LOT_COLUMNS = ("expiry_date", "batch_no")
+
+_CATALOG_ALIASES = {
+    "price": "sell_price",
+    "retail_price": "sell_price",
+    "selling_price": "sell_price",
+    "cost": "buy_price",
+    "cost_price": "buy_price",
+    "buying_price": "buy_price",
+    "pack_size": "units_per_pack",
+    "policy": "sale_policy",
+}
+
+
+def _catalog_header(header):
+    key = str(header or "").strip().lower().replace(" ", "_")
+    return _CATALOG_ALIASES.get(key) or _HEADER_ALIASES.get(key, key)
+
+
+def read_catalog_chunks(file, filename, chunksize=CATALOG_CHUNK_ROWS):
+    import pandas as pd
+
+    if _is_excel(filename):
+        # Excel has no streaming reader in pandas; slice after loading
+        frame = pd.read_excel(file, dtype=str)
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+        return
+
+    yield from pd.read_csv(file, dtype=str, chunksize=chunksize,
+                           keep_default_na=False, skip_blank_lines=True)
+
+
+def _parse_expiry_column(values):
+    import pandas as pd
+
+    # One vectorized pass per accepted format, filling only what is still missing
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for fmt in EXPIRY_FORMATS:
+        missing = parsed.isna() & values.ne("")
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], format=fmt, errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d")
+
+
+def prepare_catalog_chunk(frame):
+    # Returns (clean rows frame, [(line_no, reason)])
+    import pandas as pd
+
+    frame = frame.rename(columns=_catalog_header)
+    frame = frame.reindex(columns=CATALOG_COLUMNS).fillna("")
+    for col in CATALOG_COLUMNS:
+        frame[col] = frame[col].astype(str).str.strip()
+
+    line_no = pd.Series(frame.index + 2, index=frame.index)   # header is line 1
+    problems = pd.Series("", index=frame.index)
+
+    for col in ("buy_price", "sell_price", "units_per_pack"):
+        raw = frame[col].str.replace(",", "", regex=False)
+        frame[col] = pd.to_numeric(raw, errors="coerce")
+        bad = raw.ne("") & (frame[col].isna() | frame[col].lt(0))
+        problems[bad] = f"invalid {col}"
+
+    expiry = _parse_expiry_column(frame["expiry_date"])
+    problems[frame["expiry_date"].ne("") & expiry.isna()] = "unreadable expiry_date"
+    frame["expiry_date"] = expiry
+
+    # Blank stays blank: existing medicines keep their policy, new ones get the default
+    policy = frame["sale_policy"].str.upper()
+    problems[policy.ne("") & ~policy.isin(SALE_POLICIES)] = "unknown sale_policy"
+    frame["sale_policy"] = policy
+
+    # A name is needed to add a medicine, or to tell one apart without a barcode
+    problems[frame["name"].eq("") & frame["barcode"].eq("")] = "missing name and barcode"
+
+    rejected = problems.ne("")
+    errors = list(zip(line_no[rejected].tolist(), problems[rejected].tolist()))
+
+    clean = frame[~rejected].copy()
+    clean["units_per_pack"] = clean["units_per_pack"].round().astype("Int64")
+    clean = clean.astype(object)
+    clean = clean.where(clean.notna(), None).replace({"": None})
+
+    # A barcode repeated inside one file: the last line wins
+    with_code = clean["barcode"].notna()
+    duplicated = with_code & clean.duplicated(subset="barcode", keep="last")
+    errors += [(n, "duplicate barcode in file (later line used)")
+               for n in line_no[duplicated.index[duplicated]].tolist()]
+    clean = clean[~duplicated]
+
+    # The same for name + strength on lines without a barcode
+    keys = _name_keys(clean)
+    duplicated = clean["barcode"].isna() & keys.duplicated(keep="last")
+    errors += [(n, "same name and strength as a later line without barcode (later line used)")
+               for n in line_no[duplicated.index[duplicated]].tolist()]
+    clean = clean[~duplicated]
+
+    return clean, errors
+
+
+def _name_key(name, strength):
+    return (" ".join(str(name or "").lower().split()), " ".join(str(strength or "").lower().split()))
+
+
+def _name_keys(frame):
+    import pandas as pd
+
+    return pd.Series(
+        [_name_key(n, s) for n, s in zip(frame["name"], frame["strength"])],
+        index=frame.index, dtype=object,
+    )
+
+
+def upsert_catalog_chunk(conn, clean):
+    # Returns (inserted, updated, [(line_no, reason)] for the rows left alone)
+    codes = clean["barcode"].dropna().tolist()
+    existing = set()
+    if codes:
+        marks = ", ".join("?" for _ in codes)
+        existing = {r[0] for r in conn.execute(
+            f"SELECT barcode FROM medicines WHERE barcode IN ({marks})", codes
+        )}
+
+    is_existing = clean["barcode"].isin(existing)
+    new_rows = clean[~is_existing]
+    skipped = []
+
+    # Only an update may leave the name out
+    nameless = new_rows["name"].isna()
+    skipped += [(i + 2, "missing name (new barcode)") for i in new_rows.index[nameless]]
+    new_rows = new_rows[~nameless]
+
+    no_code = new_rows["barcode"].isna()
+    if no_code.any():
+        names = sorted({key[0] for key in _name_keys(new_rows[no_code])})
+        marks = ", ".join("?" for _ in names)
+        known = {_name_key(name, strength) for name, strength in conn.execute(
+            f"SELECT name, strength FROM medicines WHERE lower(name) IN ({marks})", names
+        )}
+        present = no_code & _name_keys(new_rows).isin(known)
+        skipped += [(i + 2, "no barcode and this name + strength already exists (not added again)")
+                    for i in new_rows.index[present]]
+        new_rows = new_rows[~present]
+
+    new_rows = new_rows.copy()
+    new_rows["sale_policy"] = new_rows["sale_policy"].where(new_rows["sale_policy"].notna(), DEFAULT_SALE_POLICY)
+
+    columns = ", ".join(CATALOG_COLUMNS)
+    placeholders = ", ".join("?" for _ in CATALOG_COLUMNS)
+    conn.executemany(f"""
+        INSERT INTO medicines ({columns}, units_in_stock)
+        VALUES ({placeholders}, 0)
+    """, new_rows.itertuples(index=False, name=None))
+
+    # Blank cells (None) keep the stored value
+    updatable = [c for c in CATALOG_COLUMNS if c != "barcode" and c not in _LOT_COLUMNS]
+    updates = ", ".join(f"{c} = COALESCE(?, {c})" for c in updatable)
+    conn.executemany(f"""
+        UPDATE medicines SET {updates}
+        WHERE barcode = ?
+    """, clean.loc[is_existing, updatable + ["barcode"]].itertuples(index=False, name=None))
+
+    return len(new_rows), int(is_existing.sum()), skipped
+
+
+def import_catalog(file, filename, on_chunk=None):
+    report = {"rows": 0, "inserted": 0, "updated": 0, "rejected": []}
+
+    for chunk in read_catalog_chunks(file, filename):
+        clean, errors = prepare_catalog_chunk(chunk)
+        report["rows"] += len(chunk)
+        report["rejected"] += errors
+
+        # One transaction per chunk keeps the write lock short for the tills
+        if len(clean):
+            with write_transaction() as conn:
+                inserted, updated, skipped = upsert_catalog_chunk(conn, clean)
+            report["inserted"] += inserted
+            report["updated"] += updated
+            report["rejected"] += skipped
+
+        if on_chunk:
+            on_chunk(report)
+
+    return report
@@ -0,0 +1,85 @@
+import secrets
+from datetime import datetime
+
+from stock import decrement_stock
+from writer import execute
+
+# ======================================================
+# Cart / basket
+# ------------------------------------------------------
+# Lines are plain dicts so they can live in st.session_state:
+#   {"medicine_id", "label", "quantity", "sale_type", "unit_price", "total"}
+# checkout() writes the whole basket atomically under one receipt number,
+# through the group-commit writer.
+# ======================================================
+
+SALE_TYPES = ("QUICK", "DOSAGE")     # Quick Sale (OTC counter), Dosage Sale (prescriptions)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        # shortages: [(medicine_id, label, requested, available)]
+        self.shortages = shortages
+        super().__init__(
+            "; ".join(f"{label}: need {req}, have {have}" for _, label, req, have in shortages)
+        )
+
+
+def make_line(medicine_id, label, quantity, sale_type, unit_price):
+    return {
+        "medicine_id": medicine_id,
+        "label": label,
+        "quantity": int(quantity),
+        "sale_type": sale_type,
+        "unit_price": unit_price,
+        "total": quantity * unit_price,
+    }
+
+
+def quantity_in_cart(lines, medicine_id):
+    return sum(line["quantity"] for line in lines if line["medicine_id"] == medicine_id)
+
+
+def cart_total(lines):
+    return sum(line["total"] for line in lines)
+
+
+def new_receipt_no():
+    return f"R{datetime.now():%Y%m%d%H%M%S}-{secrets.token_hex(2).upper()}"
+
+
+def _units_by_medicine(lines):
+    units = {}
+    for line in lines:
+        units[line["medicine_id"]] = units.get(line["medicine_id"], 0) + line["quantity"]
+    return units
+
+
+def checkout(lines):
+    if not lines:
+        raise ValueError("Cart is empty")
+
+    units = _units_by_medicine(lines)
+    labels = {line["medicine_id"]: line["label"] for line in lines}
+    receipt_no = new_receipt_no()
+
+    def write(conn):
+        # Stock is checked and taken under the write lock, so two tills
+        # selling the last units cannot both succeed
+        short = decrement_stock(conn, units)
+        if short:
+            raise InsufficientStock([
+                (mid, labels[mid], units[mid], have) for mid, have in short.items()
+            ])
+
+        conn.executemany("""
+            INSERT INTO sales (medicine_id, quantity, sale_type, total_price, receipt_no)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (line["medicine_id"], line["quantity"], line["sale_type"], line["total"], receipt_no)
+            for line in lines
+        ])
+
+    # Committed together with any other tills' sales (writer.py)
+    execute(write)
+    return receipt_no
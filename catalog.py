@@ -0,0 +1,157 @@
+import threading
+from collections import namedtuple
+
+from database import get_connection, data_version
+from diagnostics import timed
+from forecast import DEFAULT_REORDER_POINT
+
+# ======================================================
+# Shared medicine catalog cache
+# ------------------------------------------------------
+# One snapshot per process, shared by every Streamlit session. It is
+# brought up to date lazily the first time it is read after
+# database.data_version() moves, i.e. after a committed write from this or
+# any other process. Triggers stamp every medicine a write touches with the
+# version it commits as (medicines.changed_version, migrations.py), so an
+# update re-reads just those rows; a checkout touches a handful of them.
+#
+# Per-lot stock (what is sellable, the next lot to expire) changes with
+# every sale and with the date, so it is not cached here: callers ask
+# stock.lot_stock() for the medicines they show.
+# ======================================================
+
+_MEDICINE_FIELDS = (
+    "id", "name", "strength", "form", "barcode", "batch_no",
+    "units_in_stock", "sell_price", "sale_policy", "expiry_iso",
+)
+
+# reorder_point: from the demand forecast (forecast.py)
+CatalogItem = namedtuple("CatalogItem", _MEDICINE_FIELDS + ("reorder_point",))
+
+_SELECT = f"""
+    SELECT {", ".join("m." + field for field in _MEDICINE_FIELDS)},
+           COALESCE(f.reorder_point, {DEFAULT_REORDER_POINT})
+    FROM medicines m
+    LEFT JOIN demand_forecast f ON f.medicine_id = m.id
+"""
+
+_lock = threading.Lock()
+_catalog = None
+
+
+class Catalog:
+    def __init__(self, version, items, previous_version=None, changed=None):
+        self.version = version
+        self.items = items
+        # changed: the items that differ from the catalog at previous_version;
+        # None when this one was loaded from scratch
+        self.previous_version = previous_version
+        self.changed = changed
+        self.by_id = {item.id: item for item in items}
+        self.by_barcode = {item.barcode: item for item in items if item.barcode}
+        self.names = [item.name for item in items]
+
+        self.id_by_name = {item.name: item.id for item in items}
+
+        self._label_maps = {}
+
+    def get(self, medicine_id):
+        return self.by_id.get(medicine_id)
+
+    def sale_labels(self, policy=None):
+        # {"Name Strength (Stock: n)": CatalogItem}, optionally for one sale_policy
+        if policy not in self._label_maps:
+            self._label_maps[policy] = {
+                sale_label(item): item
+                for item in self.items
+                if policy is None or item.sale_policy == policy
+            }
+        return self._label_maps[policy]
+
+    def updated(self, version, changed):
+        # A copy with `changed` items replacing / joining this one's
+        new = Catalog.__new__(Catalog)
+        new.version = version
+        new.previous_version = self.version
+        new.changed = changed
+        new.by_id = dict(self.by_id)
+        new.by_barcode = dict(self.by_barcode)
+        new.id_by_name = dict(self.id_by_name)
+        new._label_maps = {}
+
+        reorder = False
+        for item in changed:
+            old = new.by_id.get(item.id)
+            if old is not None:
+                if old.barcode and new.by_barcode.get(old.barcode) is old:
+                    del new.by_barcode[old.barcode]
+                if new.id_by_name.get(old.name) == old.id:
+                    del new.id_by_name[old.name]
+                reorder = reorder or old.name != item.name
+            else:
+                reorder = True
+            new.by_id[item.id] = item
+            if item.barcode:
+                new.by_barcode[item.barcode] = item
+            new.id_by_name[item.name] = item.id
+
+        if reorder:
+            new.items = sorted(new.by_id.values(), key=lambda item: item.name)
+        else:
+            new.items = [new.by_id[item.id] for item in self.items]
+        new.names = [item.name for item in new.items]
+        return new
+
+
+def sale_label(item):
+    return f"{item.name} {item.strength} (Stock: {item.units_in_stock})"
+
+
+def _load(version):
+    conn = get_connection()
+    try:
+        items = [CatalogItem(*row) for row in conn.execute(_SELECT + " ORDER BY m.name")]
+    finally:
+        conn.close()
+    return Catalog(version, items)
+
+
+def _refresh(catalog, version):
+    # Re-reads the medicines changed since `catalog` was loaded; None if a
+    # full load is needed (medicines were deleted)
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN")
+        changed = [
+            CatalogItem(*row)
+            for row in conn.execute(_SELECT + " WHERE m.changed_version > ?", (catalog.version,))
+        ]
+        total = conn.execute("SELECT COUNT(*) FROM medicines").fetchone()[0]
+    finally:
+        conn.rollback()
+        conn.close()
+
+    added = sum(1 for item in changed if item.id not in catalog.by_id)
+    if total != len(catalog.items) + added:
+        return None
+    return catalog.updated(version, changed)
+
+
+def get_catalog():
+    global _catalog
+    # Read the version before loading: a write racing the load only causes
+    # one extra refresh on the next call, never a stale cache.
+    version = data_version()
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _lock:
+        if _catalog is not None and _catalog.version != version:
+            with timed("catalog.refresh"):
+                _catalog = _refresh(_catalog, version)
+        if _catalog is None:
+            with timed("catalog.load"):
+                _catalog = _load(version)
+        return _catalog
+
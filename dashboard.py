@@ -0,0 +1,233 @@
+import threading
+import time
+from datetime import timedelta
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from catalog import get_catalog
+from database import data_version
+from diagnostics import timed
+from sales_counter import today_total, utc_today
+from snapshot import as_of_label, current_as_of, reporting_connection
+
+# ======================================================
+# Sales analytics dashboard
+# ------------------------------------------------------
+# Two grouped reads per window, then vectorized pandas/numpy. They come
+# from the daily_sales_summary rollup (one row per day, sale type and medicine)
+# rather than raw sales, which can hold millions of rows for the same
+# totals. Medicine names and stock come from the catalog cache.
+#
+# The computed frames are cached per window. An entry is reused until it
+# is older than CACHE_TTL_SECONDS, or until data has changed
+# (data_version) and the entry is older than MIN_REFRESH_SECONDS. The
+# second rule stops every sale during rush hour from forcing a full
+# recompute on the landing page. An entry read from the reporting snapshot
+# that is still current is kept whatever data_version says.
+# ======================================================
+
+WINDOWS = (7, 30, 90, 365)
+CACHE_TTL_SECONDS = 300
+MIN_REFRESH_SECONDS = 30
+TOP_N = 10
+
+_lock = threading.Lock()
+_cache = {}     # window days -> (data version, computed at, aggregates)
+
+
+def _read_rollup(first_day):
+    # Two grouped reads in one transaction on the reporting snapshot
+    # (snapshot.py): (day, sale_type) and per medicine.
+    # Summing in SQLite first keeps a year of history from being
+    # materialized row by row in Python.
+    conn, as_of = reporting_connection()
+    try:
+        conn.execute("BEGIN")
+        by_day = conn.execute("""
+            SELECT day, sale_type, SUM(tx_count), SUM(revenue)
+            FROM daily_sales_summary
+            WHERE day >= ?
+            GROUP BY day, sale_type
+        """, (first_day.isoformat(),)).fetchall()
+        by_medicine = conn.execute("""
+            SELECT medicine_id, SUM(tx_count), SUM(units), SUM(revenue)
+            FROM daily_sales_summary
+            WHERE day >= ?
+            GROUP BY medicine_id
+        """, (first_day.isoformat(),)).fetchall()
+    finally:
+        conn.rollback()
+        conn.close()
+    return (
+        as_of,
+        pd.DataFrame.from_records(by_day, columns=["day", "sale_type", "tx_count", "revenue"]),
+        pd.DataFrame.from_records(by_medicine, columns=["medicine_id", "tx_count", "units", "revenue"]),
+    )
+
+
+def _medicines_frame():
+    items = get_catalog().items
+    return pd.DataFrame({
+        "medicine_id": np.fromiter((i.id for i in items), dtype=np.int64, count=len(items)),
+        "medicine": [f"{i.name} {i.strength or ''}".strip() for i in items],
+        "units_in_stock": np.fromiter((i.units_in_stock or 0 for i in items), dtype=np.int64, count=len(items)),
+    })
+
+
+def compute_aggregates(days, today=None):
+    today = today or utc_today()
+    first_day = today - timedelta(days=days - 1)
+    as_of, by_day, per_medicine = _read_rollup(first_day)
+    medicines = _medicines_frame()
+
+    # ---- revenue trend, with empty days filled in ----
+    all_days = pd.date_range(first_day, today, freq="D")
+    trend = (
+        by_day.assign(day=pd.to_datetime(by_day["day"]))
+        .groupby("day")[["revenue", "tx_count"]].sum()
+        .reindex(all_days, fill_value=0)
+        .rename_axis("day").reset_index()
+    )
+    trend["rolling_7d"] = trend["revenue"].rolling(7, min_periods=1).mean()
+
+    # ---- per-medicine velocity over the window ----
+    velocity = medicines.merge(per_medicine, on="medicine_id", how="left").fillna(
+        {"units": 0, "revenue": 0.0, "tx_count": 0}
+    ).astype({"units": "int64", "revenue": "float64", "tx_count": "int64"})
+    velocity["units_per_day"] = velocity["units"] / days
+    velocity["days_of_cover"] = np.where(
+        velocity["units_per_day"] > 0,
+        velocity["units_in_stock"] / velocity["units_per_day"].where(velocity["units_per_day"] > 0, 1),
+        np.inf,
+    )
+
+    top_sellers = velocity.nlargest(TOP_N, "revenue")[["medicine", "units", "revenue"]]
+    slow_movers = (
+        velocity[velocity["units_in_stock"] > 0]
+        .sort_values(["units_per_day", "units_in_stock"], ascending=[True, False])
+        .head(TOP_N)[["medicine", "units_in_stock", "units", "units_per_day"]]
+    )
+    fastest = velocity.nlargest(TOP_N, "units_per_day")[
+        ["medicine", "units_per_day", "units_in_stock", "days_of_cover"]
+    ]
+
+    # ---- sale type mix (QUICK = OTC counter, DOSAGE = prescriptions) ----
+    mix = by_day.groupby("sale_type")[["revenue", "tx_count"]].sum().reset_index()
+
+    return {
+        "days": days,
+        "first_day": first_day,
+        "as_of": as_of,
+        "revenue": float(by_day["revenue"].sum()),
+        "transactions": int(by_day["tx_count"].sum()),
+        "trend": trend,
+        "top_sellers": top_sellers,
+        "fastest": fastest,
+        "slow_movers": slow_movers,
+        "mix": mix,
+    }
+
+
+def get_aggregates(days):
+    version = data_version()
+    now = time.monotonic()
+    entry = _cache.get(days)
+    if entry is not None:
+        cached_version, computed_at, aggregates = entry
+        age = now - computed_at
+        unchanged = cached_version == version or (
+            aggregates["as_of"] is not None and aggregates["as_of"] == current_as_of()
+        )
+        if age < CACHE_TTL_SECONDS and (unchanged or age < MIN_REFRESH_SECONDS):
+            return aggregates, age
+
+    with _lock:
+        with timed("dashboard.compute"):
+            aggregates = compute_aggregates(days)
+        _cache[days] = (version, time.monotonic(), aggregates)
+    return aggregates, 0.0
+
+
+# ==============================
+# 📊 SCREEN
+# ==============================
+def dashboard_screen():
+    st.subheader("📊 Dashboard")
+
+    days = st.radio("Period", WINDOWS, index=1, horizontal=True, format_func=lambda d: f"{d} days")
+    data, age = get_aggregates(days)
+
+    transactions_today, revenue_today = today_total()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Revenue today", f"KES {revenue_today:,.0f}", f"{transactions_today} transactions", delta_color="off")
+    col2.metric(f"Revenue, last {days} days", f"KES {data['revenue']:,.0f}")
+    col3.metric(f"Sale lines, last {days} days", f"{data['transactions']:,}")
+    st.caption(f"{as_of_label(data['as_of'])} Computed {int(age)}s ago, UTC days from {data['first_day']}.")
+
+    if not data["transactions"]:
+        st.info("No sales in this period yet.")
+        return
+
+    # ---- revenue trend ----
+    st.markdown("### 📈 Revenue trend")
+    trend = data["trend"]
+    base = alt.Chart(trend).encode(x=alt.X("day:T", title=None))
+    st.altair_chart(
+        base.mark_bar(opacity=0.5).encode(y=alt.Y("revenue:Q", title="Revenue (KES)"), tooltip=["day:T", "revenue:Q", "tx_count:Q"])
+        + base.mark_line(color="#d62728").encode(y="rolling_7d:Q"),
+        width="stretch",
+    )
+
+    col1, col2 = st.columns(2)
+
+    # ---- top sellers ----
+    with col1:
+        st.markdown("### 🏆 Top sellers")
+        st.altair_chart(
+            alt.Chart(data["top_sellers"]).mark_bar().encode(
+                x=alt.X("revenue:Q", title="Revenue (KES)"),
+                y=alt.Y("medicine:N", sort="-x", title=None),
+                tooltip=["medicine", "units", "revenue"],
+            ),
+            width="stretch",
+        )
+
+    # ---- OTC vs dosage ----
+    with col2:
+        st.markdown("### 🧾 Sale type mix")
+        st.altair_chart(
+            alt.Chart(data["mix"]).mark_arc(innerRadius=50).encode(
+                theta="revenue:Q",
+                color=alt.Color("sale_type:N", title="Sale type"),
+                tooltip=["sale_type", "revenue", "tx_count"],
+            ),
+            width="stretch",
+        )
+
+    col1, col2 = st.columns(2)
+
+    # ---- velocity ----
+    with col1:
+        st.markdown("### 🚀 Fastest moving")
+        fastest = data["fastest"].replace(np.inf, np.nan)
+        st.dataframe(
+            fastest.rename(columns={
+                "medicine": "Medicine", "units_per_day": "Units / day",
+                "units_in_stock": "In stock", "days_of_cover": "Days of cover",
+            }).round(1),
+            hide_index=True, width="stretch",
+        )
+
+    # ---- slow movers ----
+    with col2:
+        st.markdown("### 🐌 Slow movers (in stock)")
+        st.dataframe(
+            data["slow_movers"].rename(columns={
+                "medicine": "Medicine", "units_in_stock": "In stock",
+                "units": f"Sold ({days}d)", "units_per_day": "Units / day",
+            }).round(2),
+            hide_index=True, width="stretch",
+        )
@@ -1,73 +1,232 @@
 import sqlite3
 import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from diagnostics import TimedConnection, count, timed
+from migrations import migrate
 
 DB_PATH = "data/i_dawa.db"
 
+# =========================
+# Connection tuning
+# =========================
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16 * 1024          # negative cache_size is in KiB
+MMAP_SIZE = 128 * 1024 * 1024
+POOL_SIZE = 8
+
+# Extra attempts after busy_timeout has already run out (several tills, one file)
+BUSY_RETRIES = 3
+BUSY_BACKOFF_SECONDS = 0.05
+
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+_pool = queue.LifoQueue()
+_pool_lock = threading.Lock()
+_data_dir_ready = False
+_migrate_lock = threading.Lock()
+_migrated = False
+
+# data_version(): the counter in the data_version table, bumped inside every
+# invalidating write transaction by any process using the file. A private
+# watcher connection polls PRAGMA data_version (free: no disk read), which
+# changes whenever another connection commits, and only then re-reads it.
+_version_lock = threading.Lock()
+_version_watch = {"conn": None, "pragma": None, "version": 0}
+
+
+def _open_connection():
+    global _data_dir_ready
+    if not _data_dir_ready:
+        os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+        _data_dir_ready = True
+
+    # Pooled connections move between Streamlit script threads, but each one is
+    # only ever checked out by a single thread at a time. TimedConnection
+    # feeds every statement's timing to diagnostics.py.
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=TimedConnection,
+    )
+    count("db.connection_opened")
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# Checked-out pool connection; close() hands it back to the pool
+class PooledConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed connection.")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            _release(conn)
+
+    def __del__(self):
+        # Screens that return early without closing still give the connection back
+        self.close()
+
+
+def _release(conn):
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        return
+
+    if _pool.qsize() >= POOL_SIZE:
+        conn.close()
+    else:
+        _pool.put(conn)
+
+
 def get_connection():
-    os.makedirs("data", exist_ok=True)
-    return sqlite3.connect(DB_PATH)
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    return PooledConnection(conn)
 
-def column_exists(cursor, table_name, column_name):
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [col[1] for col in cursor.fetchall()]
-    return column_name in columns
 
-def init_db():
+def close_all():
+    # Drop every idle pooled connection (tests, DB_PATH switches, shutdown)
+    global _data_dir_ready, _migrated
+    with _pool_lock:
+        while True:
+            try:
+                _pool.get_nowait().close()
+            except queue.Empty:
+                break
+        _data_dir_ready = False
+        _migrated = False
+    with _version_lock:
+        if _version_watch["conn"] is not None:
+            _version_watch["conn"].close()
+        _version_watch.update(conn=None, pragma=None, version=0)
+
+
+def data_version():
+    # Caches compare against this; it moves after writes from any process
+    with _version_lock:
+        conn = _version_watch["conn"]
+        if conn is None:
+            conn = _version_watch["conn"] = sqlite3.connect(
+                DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False
+            )
+        pragma = conn.execute("PRAGMA data_version").fetchone()[0]
+        if pragma != _version_watch["pragma"]:
+            _version_watch["pragma"] = pragma
+            try:
+                row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+            except sqlite3.OperationalError:
+                row = None      # not migrated yet
+            _version_watch["version"] = row[0] if row else 0
+        return _version_watch["version"]
+
+
+def bump_data_version(conn):
+    # Call inside the write transaction, before it commits
+    conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+
+
+@contextmanager
+def read_transaction():
+    # One consistent WAL snapshot for every query inside the block
     conn = get_connection()
-    cursor = conn.cursor()
-
-    # =========================
-    # Medicines table
-    # =========================
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS medicines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        strength TEXT,
-        form TEXT,
-        unit_type TEXT,
-        units_per_pack INTEGER,
-        units_in_stock INTEGER DEFAULT 0,
-        expiry_date TEXT,
-        buy_price REAL,
-        sell_price REAL,
-        sale_policy TEXT
-    )
-    """)
-
-    # Safely add missing columns
-    for col_name, col_type in [("batch_no", "TEXT"), ("barcode", "TEXT")]:
-        if not column_exists(cursor, "medicines", col_name):
-            cursor.execute(f"ALTER TABLE medicines ADD COLUMN {col_name} {col_type}")
-
-    # =========================
-    # Sales table
-    # =========================
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS sales (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        medicine_id INTEGER,
-        quantity INTEGER,
-        sale_type TEXT,
-        total_price REAL,
-        sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-
-    # =========================
-    # Purchases table
-    # =========================
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS purchases (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        medicine_id INTEGER,
-        quantity INTEGER,
-        buy_price REAL,
-        supplier TEXT,
-        expiry_date TEXT,
-        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    try:
+        conn.execute("BEGIN")
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.close()
+
+
+@contextmanager
+def write_transaction(invalidate=True):
+    # Takes the write lock up front so the block never fails half-way on SQLITE_BUSY.
+    # invalidate=False is for bookkeeping tables that no cache depends on.
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        if invalidate:
+            bump_data_version(conn)
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class DatabaseBusy(Exception):
+    pass
+
+
+def is_busy(error):
+    return isinstance(error, sqlite3.OperationalError) and (
+        "locked" in str(error) or "busy" in str(error)
     )
-    """)
 
-    conn.commit()
-    conn.close()
+
+def with_busy_retry(fn, retries=BUSY_RETRIES, backoff=BUSY_BACKOFF_SECONDS):
+    # Runs fn() (which opens its own write_transaction) again when the write
+    # lock could not be taken, with jittered exponential backoff. Each attempt
+    # is a whole transaction, so nothing from a failed attempt is kept.
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e):
+                raise
+            if attempt == retries:
+                raise DatabaseBusy(f"Database still busy after {retries + 1} attempts") from e
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+
+def init_db():
+    # Cheap no-op after the first call, so app.py can keep calling it on every rerun
+    global _migrated
+    count("db.init_db_call")
+    if _migrated:
+        return
+
+    with _migrate_lock:
+        if _migrated:
+            return
+        conn = get_connection()
+        try:
+            with timed("db.init_db_migrate"):
+                migrate(conn)
+        finally:
+            conn.close()
+        _migrated = True
@@ -0,0 +1,236 @@
+import csv
+import io
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ======================================================
+# Diagnostics: query, render and cache counters
+# ------------------------------------------------------
+# database.py opens every connection with TimedConnection, whose cursors
+# time execute() plus every fetch of the result, so a statement's cost
+# includes the rows the caller actually read. Python's trace callback only
+# reports statement text, not durations, so timing lives in the cursor.
+# Statements are aggregated by their SQL text (whitespace collapsed);
+# anything slower than SLOW_QUERY_MS is also kept in a bounded slow-query
+# log together with its EXPLAIN QUERY PLAN.
+#
+# render_timer() times a screen and count() / timed() cover everything
+# else (init_db, catalog loads, ...). Everything is in memory, per process,
+# and cheap enough to leave on.
+# ======================================================
+
+SLOW_QUERY_MS = 100
+SLOW_LOG_SIZE = 200
+MAX_STATEMENTS = 2000       # distinct SQL texts tracked; the rest share one bucket
+
+_lock = threading.Lock()
+_queries = {}               # sql -> [calls, rows, total_ms, max_ms]
+_renders = {}               # screen -> [renders, total_ms, max_ms]
+_counters = {}              # name -> [calls, total_ms]
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_started = time.time()
+
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize(sql):
+    return _SPACES.sub(" ", sql).strip()
+
+
+# ==============================
+# ⏱️ QUERY TIMING
+# ==============================
+def _explain(conn, sql, params):
+    try:
+        rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        return f"(no plan: {e})"
+    return "\n".join(row[-1] for row in rows)
+
+
+def _record_query(key, rows, elapsed_ms, statement_ms, new_call):
+    with _lock:
+        stats = _queries.get(key)
+        if stats is None:
+            if len(_queries) >= MAX_STATEMENTS:
+                key = "(other statements)"
+                stats = _queries.setdefault(key, [0, 0, 0.0, 0.0])
+            else:
+                stats = _queries[key] = [0, 0, 0.0, 0.0]
+        stats[0] += new_call
+        stats[1] += rows
+        stats[2] += elapsed_ms
+        stats[3] = max(stats[3], statement_ms)
+
+
+class TimedCursor(sqlite3.Cursor):
+    _key = None
+    _params = ()
+    _elapsed = 0.0
+    _logged = False
+
+    def _finish_step(self, began, rows=0, new_call=False):
+        elapsed = (time.perf_counter() - began) * 1000
+        self._elapsed += elapsed
+        _record_query(self._key, rows, elapsed, self._elapsed, new_call)
+        if self._elapsed >= SLOW_QUERY_MS and not self._logged:
+            self._logged = True
+            _slow.append({
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "ms": round(self._elapsed, 2),
+                "sql": self._key,
+                "params": repr(self._params)[:200],
+                "plan": _explain(self.connection, self._key, self._params),
+            })
+
+    def _start(self, sql, params):
+        self._key = _normalize(sql)
+        self._params = params
+        self._elapsed = 0.0
+        self._logged = False
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        began = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish_step(began, new_call=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq = seq_of_parameters if isinstance(seq_of_parameters, (list, tuple)) else list(seq_of_parameters)
+        self._start(sql, seq[0] if seq else ())
+        began = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            self._finish_step(began, len(seq), new_call=True)
+
+    def fetchone(self):
+        began = time.perf_counter()
+        row = super().fetchone()
+        if self._key is not None:
+            self._finish_step(began, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        began = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if self._key is not None:
+            self._finish_step(began, len(rows))
+        return rows
+
+    def fetchall(self):
+        began = time.perf_counter()
+        rows = super().fetchall()
+        if self._key is not None:
+            self._finish_step(began, len(rows))
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute() would otherwise bypass the cursor overrides
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ==============================
+# ⏱️ RENDERS AND COUNTERS
+# ==============================
+@contextmanager
+def render_timer(screen):
+    # Recorded even when the screen stops early (st.rerun / st.stop raise)
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - began) * 1000
+        with _lock:
+            stats = _renders.setdefault(screen, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+
+def count(name, elapsed_ms=0.0):
+    with _lock:
+        stats = _counters.setdefault(name, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed_ms
+
+
+@contextmanager
+def timed(name):
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        count(name, (time.perf_counter() - began) * 1000)
+
+
+# ==============================
+# 📤 SNAPSHOT / EXPORT
+# ==============================
+def snapshot():
+    with _lock:
+        queries = [
+            {"sql": sql, "calls": calls, "rows": rows, "total_ms": round(total, 2),
+             "avg_ms": round(total / calls, 3) if calls else 0.0, "max_ms": round(worst, 2)}
+            for sql, (calls, rows, total, worst) in _queries.items()
+        ]
+        renders = [
+            {"screen": screen, "renders": n, "avg_ms": round(total / n, 2), "max_ms": round(worst, 2)}
+            for screen, (n, total, worst) in _renders.items()
+        ]
+        counters = [
+            {"name": name, "calls": n, "total_ms": round(total, 2)}
+            for name, (n, total) in _counters.items()
+        ]
+        slow = list(_slow)
+
+    queries.sort(key=lambda q: q["total_ms"], reverse=True)
+    renders.sort(key=lambda r: r["avg_ms"], reverse=True)
+    counters.sort(key=lambda c: c["name"])
+    slow.reverse()
+    return {
+        "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(_started)),
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "slow_query_ms": SLOW_QUERY_MS,
+        "queries": queries,
+        "renders": renders,
+        "counters": counters,
+        "slow_queries": slow,
+    }
+
+
+def export_json():
+    return json.dumps(snapshot(), indent=2)
+
+
+def export_queries_csv():
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["sql", "calls", "rows", "total_ms", "avg_ms", "max_ms"])
+    writer.writeheader()
+    writer.writerows(snapshot()["queries"])
+    return out.getvalue()
+
+
+def reset():
+    global _started
+    with _lock:
+        _queries.clear()
+        _renders.clear()
+        _counters.clear()
+        _slow.clear()
+        _started = time.time()
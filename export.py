@@ -0,0 +1,187 @@
+import argparse
+import csv
+import gzip
+import os
+from datetime import date, datetime, timedelta
+
+from archive import read_history
+from database import init_db
+
+# ======================================================
+# Streaming history export
+# ------------------------------------------------------
+# Sales or purchases joined with medicines for a date range, read from one
+# cursor in fixed-size chunks (fetchmany) inside a single read snapshot and
+# written out chunk by chunk, so memory stays flat however many rows the
+# range holds. Formats: csv, csv.gz and parquet (needs pyarrow).
+#
+#   python export.py sales --from 2025-01-01 --to 2025-12-31 --format csv.gz
+# ======================================================
+
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_DIR = os.path.join("data", "exports")
+FORMATS = ("csv", "csv.gz", "parquet")
+
+# Optional: Parquet output
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_ENABLED = True
+except Exception:
+    PARQUET_ENABLED = False
+
+
+# kind -> ([(column, arrow type)], query over [start, end) reading from {source})
+HISTORY = {
+    "sales": (
+        [
+            ("sale_id", "int64"), ("receipt_no", "string"), ("sale_date", "string"),
+            ("medicine_id", "int64"), ("medicine", "string"), ("strength", "string"),
+            ("barcode", "string"), ("sale_type", "string"), ("quantity", "int64"),
+            ("total_price", "float64"),
+        ],
+        """
+        SELECT s.id, s.receipt_no, s.sale_date, s.medicine_id, m.name, m.strength,
+               m.barcode, s.sale_type, s.quantity, s.total_price
+        FROM {source} s
+        LEFT JOIN medicines m ON m.id = s.medicine_id
+        WHERE s.sale_date >= ? AND s.sale_date < ?
+        ORDER BY s.sale_date, s.id
+        """,
+    ),
+    "purchases": (
+        [
+            ("purchase_id", "int64"), ("purchase_date", "string"), ("medicine_id", "int64"),
+            ("medicine", "string"), ("strength", "string"), ("barcode", "string"),
+            ("supplier", "string"), ("batch_no", "string"), ("expiry_date", "string"),
+            ("quantity", "int64"), ("buy_price", "float64"),
+        ],
+        """
+        SELECT p.id, p.purchase_date, p.medicine_id, m.name, m.strength, m.barcode,
+               p.supplier, p.batch_no, p.expiry_date, p.quantity, p.buy_price
+        FROM {source} p
+        LEFT JOIN medicines m ON m.id = p.medicine_id
+        WHERE p.purchase_date >= ? AND p.purchase_date < ?
+        ORDER BY p.purchase_date, p.id
+        """,
+    ),
+}
+
+
+def _iso_date(value):
+    # A date or a 'YYYY-MM-DD' string; anything looser (e.g. MM/YY) is refused
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"Export dates must be YYYY-MM-DD, got {value!r}") from None
+
+
+def _bounds(start, end):
+    # Inclusive dates -> half-open text range matching the stored timestamps
+    start, end = _iso_date(start), _iso_date(end)
+    if start > end:
+        raise ValueError("Export start date is after the end date")
+    return start, (date.fromisoformat(end) + timedelta(days=1)).isoformat()
+
+
+def iter_history(kind, start, end, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Yields lists of at most chunk_rows rows, oldest first. Ranges that reach
+    # archived history read through the archive view (archive.py).
+    columns, sql = HISTORY[kind]
+    bounds = _bounds(start, end)
+    with read_history(kind, bounds[0]) as (conn, source):
+        cur = conn.execute(sql.format(source=source), bounds)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield rows
+
+
+# ==============================
+# ✍️ WRITERS
+# ==============================
+def write_csv(chunks, columns, path, compress=False, on_chunk=None):
+    opener = gzip.open if compress else open
+    written = 0
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            written += len(rows)
+            if on_chunk:
+                on_chunk(written)
+    return written
+
+
+def write_parquet(chunks, schema, path, on_chunk=None):
+    # One row group per chunk; the file is only valid once the writer closes
+    if not PARQUET_ENABLED:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    arrow_schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in schema])
+    written = 0
+    with pq.ParquetWriter(path, arrow_schema, compression="snappy") as writer:
+        for rows in chunks:
+            table = pa.table(
+                [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(arrow_schema)],
+                schema=arrow_schema,
+            )
+            writer.write_table(table)
+            written += len(rows)
+            if on_chunk:
+                on_chunk(written)
+    return written
+
+
+def export_history(kind, start, end, fmt="csv", path=None, chunk_rows=EXPORT_CHUNK_ROWS, on_chunk=None):
+    # Returns {"path", "rows", "bytes"}
+    if kind not in HISTORY:
+        raise ValueError(f"Unknown export {kind!r}; choose from {', '.join(HISTORY)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+
+    schema, _ = HISTORY[kind]
+    _bounds(start, end)     # fail before creating the file
+    if path is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"{kind}_{start}_{end}.{fmt}")
+
+    chunks = iter_history(kind, start, end, chunk_rows)
+    # Write under a temporary name so a half-written export never looks complete
+    partial = path + ".partial"
+    try:
+        if fmt == "parquet":
+            rows = write_parquet(chunks, schema, partial, on_chunk)
+        else:
+            rows = write_csv(chunks, [name for name, _ in schema], partial, fmt == "csv.gz", on_chunk)
+    except BaseException:
+        chunks.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+
+    return {"path": path, "rows": rows, "bytes": os.path.getsize(path)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export sales or purchase history")
+    parser.add_argument("kind", choices=sorted(HISTORY))
+    parser.add_argument("--from", dest="start", required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", required=True, help="last day, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--out", help=f"output file (default: {EXPORT_DIR}/<kind>_<from>_<to>.<format>)")
+    args = parser.parse_args()
+
+    init_db()
+    report = export_history(
+        args.kind, args.start, args.end, args.format, args.out,
+        on_chunk=lambda n: print(f"  {n:,} rows", end="\r")
+    )
+    print(f"{report['rows']:,} rows -> {report['path']} ({report['bytes'] / 1024:,.0f} KiB)")
@@ -0,0 +1,140 @@
+import sys
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from database import init_db, write_transaction
+from diagnostics import timed
+from sales_counter import utc_today
+
+# ======================================================
+# Demand forecast and reorder points
+# ------------------------------------------------------
+# Daily demand per medicine is an exponentially weighted moving average of
+# units sold per day, read from the daily_sales_summary rollup. Only whole
+# (UTC) days are folded in, and each only once: forecast_state remembers
+# the last day included, so a refresh reads just the days since then and
+# updates the whole catalog in one numpy pass. For k new days:
+#
+#     demand = (1 - a)^k * demand + sum over day i of a * (1 - a)^(k-1-i) * units_i
+#
+# reorder point = demand over LEAD_TIME_DAYS + SAFETY_DAYS, at least
+# MIN_REORDER_POINT. Days of cover depends on live stock, so it is worked
+# out when read (reorder_list) rather than stored. Medicines that have
+# never sold have no forecast row and use DEFAULT_REORDER_POINT, the old
+# fixed threshold.
+#
+#   python forecast.py --rebuild
+# ======================================================
+
+DEMAND_SPAN_DAYS = 28
+ALPHA = 2 / (DEMAND_SPAN_DAYS + 1)
+HISTORY_DAYS = 180          # how far back a rebuild starts; older days weigh < 0.1%
+LEAD_TIME_DAYS = 7
+SAFETY_DAYS = 3
+MIN_REORDER_POINT = 1
+DEFAULT_REORDER_POINT = 10
+
+_lock = threading.Lock()
+_through_day = None         # last day folded in, as far as this process knows
+
+
+def _fold_days(conn, through, days):
+    # Folds the `days` days after `through` into demand_forecast
+    first = through + timedelta(days=1)
+    sold = conn.execute("""
+        SELECT medicine_id, CAST(julianday(day) - julianday(?) AS INTEGER), SUM(units)
+        FROM daily_sales_summary
+        WHERE day >= ? AND day < ? AND medicine_id > 0
+        GROUP BY day, medicine_id
+    """, (
+        first.isoformat(),
+        max(first, first + timedelta(days=days - HISTORY_DAYS)).isoformat(),
+        (first + timedelta(days=days)).isoformat(),
+    )).fetchall()
+    old = conn.execute("SELECT medicine_id, daily_demand FROM demand_forecast").fetchall()
+
+    sold = np.array(sold, dtype=np.float64).reshape(-1, 3)
+    old_ids = np.array([row[0] for row in old], dtype=np.int64)
+    sold_ids = sold[:, 0].astype(np.int64)
+    ids = np.union1d(old_ids, sold_ids)
+
+    decay = 1 - ALPHA
+    demand = np.zeros(len(ids))
+    demand[np.searchsorted(ids, old_ids)] = [row[1] for row in old]
+    demand *= decay ** days
+    weights = ALPHA * decay ** (days - 1 - sold[:, 1])
+    np.add.at(demand, np.searchsorted(ids, sold_ids), weights * sold[:, 2])
+
+    cover_days = LEAD_TIME_DAYS + SAFETY_DAYS
+    reorder = np.maximum(np.ceil(np.round(demand * cover_days, 6)), MIN_REORDER_POINT).astype(np.int64)
+
+    conn.executemany("""
+        INSERT INTO demand_forecast (medicine_id, daily_demand, reorder_point)
+        VALUES (?, ?, ?)
+        ON CONFLICT (medicine_id) DO UPDATE SET
+            daily_demand = excluded.daily_demand,
+            reorder_point = excluded.reorder_point
+    """, zip(ids.tolist(), demand.tolist(), reorder.tolist()))
+    return len(ids)
+
+
+def refresh_forecast(today=None, rebuild=False):
+    # Folds every whole day up to yesterday into the forecast; returns days folded in.
+    # Cheap to call often: once up to date it returns without touching the database.
+    global _through_day
+    yesterday = (today or utc_today()) - timedelta(days=1)
+    if not rebuild and _through_day is not None and _through_day >= yesterday:
+        return 0
+
+    with _lock, timed("forecast.refresh"):
+        with write_transaction() as conn:
+            # Re-read under the write lock: another process may have refreshed
+            state = conn.execute("SELECT through_day, alpha FROM forecast_state WHERE id = 1").fetchone()
+            if rebuild or state is None or state[1] != ALPHA:
+                conn.execute("DELETE FROM demand_forecast")
+                through = yesterday - timedelta(days=HISTORY_DAYS)
+            else:
+                through = date.fromisoformat(state[0])
+
+            days = (yesterday - through).days
+            if days > 0:
+                _fold_days(conn, through, days)
+                through = yesterday
+                conn.execute("""
+                    INSERT INTO forecast_state (id, through_day, alpha) VALUES (1, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        through_day = excluded.through_day,
+                        alpha = excluded.alpha,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (through.isoformat(), ALPHA))
+        _through_day = through
+    return max(days, 0)
+
+
+def reorder_list(conn, threshold=None, limit=None):
+    # [(name, strength, units_in_stock, reorder_point, daily_demand, days_of_cover)]
+    # at or below their reorder point (or a fixed threshold), least cover first.
+    # daily_demand / days_of_cover are None for medicines without sales history.
+    sql = """
+        SELECT m.name, m.strength, m.units_in_stock,
+               COALESCE(f.reorder_point, ?) AS reorder_point,
+               ROUND(f.daily_demand, 2),
+               ROUND(m.units_in_stock / NULLIF(f.daily_demand, 0), 1) AS days_of_cover
+        FROM medicines m
+        LEFT JOIN demand_forecast f ON f.medicine_id = m.id
+        WHERE m.units_in_stock <= COALESCE(?, f.reorder_point, ?)
+        ORDER BY days_of_cover IS NULL, days_of_cover, m.units_in_stock, m.name
+    """
+    params = (DEFAULT_REORDER_POINT, threshold, DEFAULT_REORDER_POINT)
+    if limit:
+        return conn.execute(sql + " LIMIT ?", params + (limit,)).fetchall()
+    return conn.execute(sql, params).fetchall()
+
+
+if __name__ == "__main__":
+    # python forecast.py [--rebuild]
+    init_db()
+    folded = refresh_forecast(rebuild="--rebuild" in sys.argv[1:])
+    print(f"demand forecast: {folded} day(s) folded in through {_through_day}")
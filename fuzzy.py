@@ -0,0 +1,141 @@
+import heapq
+import re
+import threading
+from collections import Counter
+
+from catalog import get_catalog
+from diagnostics import timed
+
+# ======================================================
+# Fuzzy medicine matcher (trigram index)
+# ------------------------------------------------------
+# Every medicine contributes its name, batch number and barcode as
+# normalized strings; each string is split into padded trigrams and
+# posted into an inverted index. A query only touches the postings of its
+# own trigrams, then candidates are ranked by Dice similarity.
+#
+# The index is built once from the catalog cache and afterwards kept in
+# step with it by diffing only the medicines whose searchable fields
+# changed; after a catalog refresh only the refreshed medicines are looked at.
+# ======================================================
+
+MIN_SCORE = 0.35
+FUZZY_FIELDS = ("name", "batch_no", "barcode")
+
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    text = _NON_ALNUM.sub(" ", str(text or "").lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.version = None
+        self._postings = {}     # trigram -> {entry key}
+        self._entries = {}      # (medicine_id, field) -> (text, trigram count)
+        self._fields = {}       # medicine_id -> searchable field values
+        self._names = {}        # medicine_id -> display name
+
+    def __len__(self):
+        return len(self._fields)
+
+    def add(self, medicine_id, name, values):
+        self._fields[medicine_id] = values
+        self._names[medicine_id] = name
+        for field, value in zip(FUZZY_FIELDS, values):
+            text = normalize(value)
+            if not text:
+                continue
+            grams = trigrams(text)
+            key = (medicine_id, field)
+            self._entries[key] = (text, len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, medicine_id):
+        self._fields.pop(medicine_id, None)
+        self._names.pop(medicine_id, None)
+        for field in FUZZY_FIELDS:
+            entry = self._entries.pop((medicine_id, field), None)
+            if entry is None:
+                continue
+            for gram in trigrams(entry[0]):
+                keys = self._postings.get(gram)
+                if keys is not None:
+                    keys.discard((medicine_id, field))
+                    if not keys:
+                        del self._postings[gram]
+
+    def sync(self, catalog):
+        # Apply only what changed since the last catalog snapshot; when the
+        # catalog was refreshed from the one indexed, only its changed items
+        incremental = catalog.changed is not None and catalog.previous_version == self.version
+        current = {}
+        for item in catalog.changed if incremental else catalog.items:
+            current[item.id] = (item.name, tuple(getattr(item, f) for f in FUZZY_FIELDS))
+
+        if not incremental:
+            for medicine_id in [mid for mid in self._fields if mid not in current]:
+                self.remove(medicine_id)
+
+        for medicine_id, (name, values) in current.items():
+            if self._fields.get(medicine_id) != values:
+                self.remove(medicine_id)
+                self.add(medicine_id, name, values)
+            else:
+                self._names[medicine_id] = name
+
+        self.version = catalog.version
+
+    def search(self, query, k=5, min_score=MIN_SCORE):
+        # [(medicine_id, name, matched field, score)], best first, one row per medicine
+        text = normalize(query)
+        if not text:
+            return []
+        grams = trigrams(text)
+
+        shared = Counter()
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                shared[key] += 1
+
+        best = {}
+        for key, count in shared.items():
+            score = 2 * count / (len(grams) + self._entries[key][1])
+            medicine_id, field = key
+            if score >= min_score and score > best.get(medicine_id, (None, 0))[1]:
+                best[medicine_id] = (field, score)
+
+        top = heapq.nlargest(k, best.items(), key=lambda kv: kv[1][1])
+        return [
+            (medicine_id, self._names[medicine_id], field, round(score, 3))
+            for medicine_id, (field, score) in top
+        ]
+
+
+_lock = threading.Lock()
+_index = TrigramIndex()
+
+
+def get_fuzzy_index():
+    catalog = get_catalog()
+    if _index.version != catalog.version:
+        with _lock:
+            if _index.version != catalog.version:
+                with timed("fuzzy.index_sync"):
+                    _index.sync(catalog)
+    return _index
+
+
+def fuzzy_matches(query, k=5, min_score=MIN_SCORE):
+    index = get_fuzzy_index()
+    with _lock:
+        return index.search(query, k, min_score)
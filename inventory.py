@@ -1,11 +1,73 @@
 import streamlit as st
 from database import get_connection
+from search import match_filter
+from bulk_import import import_catalog
+from services import DuplicateBarcode, add_medicine
+
+
+PAGE_SIZE = 50
+
+# Sort expressions must match an index in migrations.py for keyset paging to seek
+SORT_KEYS = {
+    "Name": "name",
+    "Stock": "units_in_stock",
+    "Expiry": "COALESCE(expiry_iso, '9999-12-31')",
+}
+
+
+# ============================
+# 🗄️ INVENTORY QUERIES
+# ============================
+def _inventory_filter(text, policy):
+    clauses, params = [], []
+    match = match_filter(text)
+    if match:
+        clauses.append(match[0])
+        params.extend(match[1])
+    if policy:
+        clauses.append("sale_policy = ?")
+        params.append(policy)
+    return clauses, params
+
+
+def count_inventory(conn, text="", policy=None):
+    clauses, params = _inventory_filter(text, policy)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return conn.execute(f"SELECT COUNT(*) FROM medicines {where}", params).fetchone()[0]
+
+
+def fetch_inventory_page(conn, sort="Name", descending=False, text="", policy=None,
+                         after=None, page_size=PAGE_SIZE):
+    # Keyset pagination: `after` is the (sort value, id) of the previous page's last row
+    key = SORT_KEYS[sort]
+    op, direction = ("<", "DESC") if descending else (">", "ASC")
+
+    clauses, params = _inventory_filter(text, policy)
+    if after is not None:
+        clauses.append(f"{key} {op}= ? AND ({key} {op} ? OR id {op} ?)")
+        params += [after[0], after[0], after[1]]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    rows = conn.execute(f"""
+        SELECT id, name, strength, form, unit_type, barcode,
+               units_in_stock, expiry_date, sell_price, sale_policy, {key}
+        FROM medicines
+        {where}
+        ORDER BY {key} {direction}, id {direction}
+        LIMIT ?
+    """, params + [page_size + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1][-1], rows[-1][0])
+    return [r[:-1] for r in rows], next_cursor
 
 
 def inventory_screen():
     st.subheader("📦 Medicine Inventory")
 
-    tabs = st.tabs(["➕ Add Medicine", "📋 View Inventory"])
+    tabs = st.tabs(["➕ Add Medicine", "📋 View Inventory", "📂 Bulk Import"])
 
     # ============================
     # ➕ ADD MEDICINE TAB
@@ -37,35 +99,22 @@ def inventory_screen():
             if not name:
                 st.error("Medicine name is required")
             else:
-                conn = get_connection()
-                cursor = conn.cursor()
-
-                # ⚠️ Optional: warn if barcode already exists
-                if barcode:
-                    cursor.execute(
-                        "SELECT id FROM medicines WHERE barcode = ?",
-                        (barcode,)
+                try:
+                    add_medicine(
+                        name, strength, form, unit_type, units_per_pack,
+                        expiry_date, buy_price, sell_price, sale_policy,
+                        barcode=barcode, batch_no=batch_no
                     )
-                    if cursor.fetchone():
-                        st.warning("⚠️ This barcode already exists in inventory.")
-
-                cursor.execute("""
-                INSERT INTO medicines
-                (barcode, name, batch_no, strength, form, unit_type,
-                 units_per_pack, units_in_stock, expiry_date,
-                 buy_price, sell_price, sale_policy)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)
-                """, (
-                    barcode if barcode else None,
-                    name, batch_no, strength, form, unit_type,
-                    units_per_pack, expiry_date,
-                    buy_price, sell_price, sale_policy
-                ))
-
-                conn.commit()
-                conn.close()
-
-                st.success("✅ Medicine added successfully")
+                except DuplicateBarcode:
+                    st.error("⚠️ This barcode already exists in inventory.")
+                else:
+                    st.success("✅ Medicine added successfully")
+
+    # ============================
+    # 📂 BULK IMPORT TAB
+    # ============================
+    with tabs[2]:
+        bulk_catalog_import()
 
     # ============================
     # 📋 VIEW INVENTORY TAB
@@ -73,47 +122,103 @@ def inventory_screen():
     with tabs[1]:
         st.markdown("### Current Stock")
 
-        conn = get_connection()
-        cursor = conn.cursor()
+        c1, c2, c3, c4 = st.columns([3, 2, 2, 1])
+        with c1:
+            text = st.text_input("Filter (name, strength, batch, barcode)", key="inv_filter")
+        with c2:
+            policy = st.selectbox("Sale Policy", ["All", "OTC", "ADVICE", "PRESCRIPTION"], key="inv_policy")
+        with c3:
+            sort = st.selectbox("Sort by", list(SORT_KEYS.keys()), key="inv_sort")
+        with c4:
+            descending = st.checkbox("Desc", key="inv_desc")
 
-        cursor.execute("""
-        SELECT barcode, name, strength, form, unit_type,
-               units_in_stock, expiry_date, sell_price, sale_policy
-        FROM medicines
-        ORDER BY name
-        """)
+        policy = None if policy == "All" else policy
+
+        # Page cursors are only valid for one filter/sort combination
+        view = (text, policy, sort, descending)
+        if st.session_state.get("inv_view") != view:
+            st.session_state.inv_view = view
+            st.session_state.inv_cursors = [None]
 
-        rows = cursor.fetchall()
+        cursors = st.session_state.inv_cursors
+
+        conn = get_connection()
+        total = count_inventory(conn, text, policy)
+        rows, next_cursor = fetch_inventory_page(
+            conn, sort, descending, text, policy, after=cursors[-1]
+        )
         conn.close()
 
-        if not rows:
+        if not total:
             st.info("No medicines in inventory.")
             return
 
-        for row in rows:
-            barcode, name, strength, form, unit_type, stock, expiry, price, policy = row
-
-            col1, col2, col3, col4, col5 = st.columns([3, 2, 2, 2, 2])
-
-            with col1:
-                st.markdown(f"**{name} {strength}**")
-                st.caption(f"{form} • {unit_type}")
-
-            with col2:
-                if barcode:
-                    st.caption("Barcode")
-                    st.code(barcode)
-                else:
-                    st.caption("No barcode")
-
-            with col3:
-                st.write(f"Stock: **{stock}**")
-
-            with col4:
-                st.write(f"Expiry: {expiry}")
+        page = len(cursors)
+        pages = max(1, -(-total // PAGE_SIZE))
+        st.caption(f"{total} medicines • page {page} of {pages}")
+
+        st.dataframe(
+            {
+                "Name": [r[1] for r in rows],
+                "Strength": [r[2] for r in rows],
+                "Form": [r[3] for r in rows],
+                "Unit": [r[4] for r in rows],
+                "Barcode": [r[5] for r in rows],
+                "Stock": [r[6] for r in rows],
+                "Expiry": [r[7] for r in rows],
+                "Price (KES)": [r[8] for r in rows],
+                "Policy": [r[9] for r in rows],
+            },
+            hide_index=True,
+            width="stretch",
+        )
 
-            with col5:
-                st.write(f"KES {price}")
-                st.caption(policy)
+        prev_col, next_col = st.columns(2)
+        with prev_col:
+            if st.button("⬅️ Previous", disabled=page == 1):
+                cursors.pop()
+                st.rerun()
+        with next_col:
+            if st.button("Next ➡️", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
+
+
+def bulk_catalog_import():
+    st.markdown("### Import Price List")
+    st.caption(
+        "Columns: barcode, name, batch_no, strength, form, unit_type, units_per_pack, "
+        "expiry_date, buy_price, sell_price, sale_policy. Existing barcodes are updated; "
+        "stock levels are not changed."
+    )
+
+    upload = st.file_uploader("Price list", type=["csv", "xlsx"], key="catalog_upload")
+    if upload is None:
+        return
+
+    if st.button("📂 Import Catalog"):
+        progress = st.empty()
+
+        def show_progress(report):
+            progress.caption(
+                f"Read {report['rows']} rows • {report['inserted']} new • {report['updated']} updated"
+            )
+
+        try:
+            report = import_catalog(upload, upload.name, on_chunk=show_progress)
+        except (ValueError, ImportError, UnicodeDecodeError) as e:
+            st.error(f"Could not read file: {e}")
+            return
 
-            st.divider()
+        st.success(
+            f"✅ Imported {report['rows']} rows: {report['inserted']} new, "
+            f"{report['updated']} updated, {len(report['rejected'])} rejected."
+        )
+        if report["rejected"]:
+            st.dataframe(
+                {
+                    "Line": [r[0] for r in report["rejected"]],
+                    "Problem": [r[1] for r in report["rejected"]],
+                },
+                hide_index=True,
+            )
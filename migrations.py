@@ -0,0 +1,540 @@
+# ======================================================
+# Versioned schema migrations
+# ------------------------------------------------------
+# Each step runs exactly once per database, in order, inside its own
+# BEGIN IMMEDIATE transaction, and is recorded in schema_version.
+# Append new steps to MIGRATIONS; never edit one that has shipped.
+# ======================================================
+
+import logging
+
+from utils.expiry import parse_expiry
+
+log = logging.getLogger(__name__)
+
+
+def column_exists(cursor, table_name, column_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    columns = [col[1] for col in cursor.fetchall()]
+    return column_name in columns
+
+
+# =========================
+# 1. Baseline schema
+# =========================
+def _baseline_schema(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS medicines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        strength TEXT,
+        form TEXT,
+        unit_type TEXT,
+        units_per_pack INTEGER,
+        units_in_stock INTEGER DEFAULT 0,
+        expiry_date TEXT,
+        buy_price REAL,
+        sell_price REAL,
+        sale_policy TEXT
+    )
+    """)
+
+    # Databases created before batch/barcode support lack these columns
+    for col_name, col_type in [("batch_no", "TEXT"), ("barcode", "TEXT")]:
+        if not column_exists(cursor, "medicines", col_name):
+            cursor.execute(f"ALTER TABLE medicines ADD COLUMN {col_name} {col_type}")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sales (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medicine_id INTEGER,
+        quantity INTEGER,
+        sale_type TEXT,
+        total_price REAL,
+        sale_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS purchases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medicine_id INTEGER,
+        quantity INTEGER,
+        buy_price REAL,
+        supplier TEXT,
+        expiry_date TEXT,
+        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+# =========================
+# 2. Secondary indexes
+# =========================
+def _secondary_indexes(cursor):
+    # Blank barcodes were historically saved as '' by some paths; they are "no barcode"
+    cursor.execute("UPDATE medicines SET barcode = NULL WHERE TRIM(barcode) = ''")
+
+    # A barcode may name one medicine only: the oldest row (lowest id) keeps
+    # it and the others lose it. Each cleared row is kept in barcode_cleanups,
+    # which the Diagnostics page lists until an admin marks it reviewed.
+    cursor.execute("""
+    SELECT barcode, MIN(id)
+    FROM medicines
+    WHERE barcode IS NOT NULL
+    GROUP BY barcode
+    HAVING COUNT(*) > 1
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS barcode_cleanups (
+            medicine_id INTEGER PRIMARY KEY,
+            name TEXT,
+            strength TEXT,
+            barcode TEXT NOT NULL,
+            kept_medicine_id INTEGER NOT NULL,
+            cleared_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reviewed INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+    for barcode, keep in duplicates:
+        cursor.execute("""
+        INSERT OR REPLACE INTO barcode_cleanups (medicine_id, name, strength, barcode, kept_medicine_id)
+        SELECT id, name, strength, barcode, ? FROM medicines WHERE barcode = ? AND id <> ?
+        """, (keep, barcode, keep))
+        cursor.execute("UPDATE medicines SET barcode = NULL WHERE barcode = ? AND id <> ?", (barcode, keep))
+        log.warning("Duplicate barcode %s: kept on medicine %s, cleared from the others", barcode, keep)
+
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_medicines_barcode
+    ON medicines(barcode) WHERE barcode IS NOT NULL
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicines_name ON medicines(name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicines_expiry ON medicines(expiry_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_medicine ON sales(medicine_id)")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_purchases_medicine_date
+    ON purchases(medicine_id, purchase_date)
+    """)
+    cursor.execute("ANALYZE")
+
+
+# =========================
+# 3. Normalized expiry dates
+# =========================
+def _normalized_expiry(cursor):
+    if not column_exists(cursor, "medicines", "expiry_iso"):
+        cursor.execute("ALTER TABLE medicines ADD COLUMN expiry_iso TEXT")
+
+    # Legacy rows may hold dd/mm/yyyy and friends, which SQLite's date() cannot read
+    cursor.execute("SELECT id, expiry_date FROM medicines WHERE expiry_date IS NOT NULL")
+    cursor.executemany(
+        "UPDATE medicines SET expiry_iso = ? WHERE id = ?",
+        [(parse_expiry(expiry), mid) for mid, expiry in cursor.fetchall()]
+    )
+
+    # Every write path stores ISO dates, so date() is enough to keep the column in sync
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_medicines_expiry_insert
+    AFTER INSERT ON medicines
+    BEGIN
+        UPDATE medicines SET expiry_iso = date(NEW.expiry_date) WHERE id = NEW.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_medicines_expiry_update
+    AFTER UPDATE OF expiry_date ON medicines
+    BEGIN
+        UPDATE medicines SET expiry_iso = date(NEW.expiry_date) WHERE id = NEW.id;
+    END
+    """)
+
+    cursor.execute("DROP INDEX IF EXISTS idx_medicines_expiry")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicines_expiry_iso ON medicines(expiry_iso)")
+
+
+# =========================
+# 4. Full-text medicine search
+# =========================
+_FTS_COLUMNS = "name, strength, form, batch_no, barcode"
+_FTS_TABLES = {
+    "medicines_fts": "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'",
+    "medicines_trgm": "tokenize = 'trigram'",
+}
+
+
+def _medicine_search(cursor):
+    old_values = ", ".join(f"old.{c.strip()}" for c in _FTS_COLUMNS.split(","))
+    new_values = ", ".join(f"new.{c.strip()}" for c in _FTS_COLUMNS.split(","))
+
+    for table, options in _FTS_TABLES.items():
+        cursor.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+            {_FTS_COLUMNS},
+            content = 'medicines', content_rowid = 'id', {options}
+        )
+        """)
+
+        delete_row = f"""
+            INSERT INTO {table} ({table}, rowid, {_FTS_COLUMNS})
+            VALUES ('delete', old.id, {old_values});
+        """
+        insert_row = f"""
+            INSERT INTO {table} (rowid, {_FTS_COLUMNS})
+            VALUES (new.id, {new_values});
+        """
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_insert
+        AFTER INSERT ON medicines
+        BEGIN {insert_row} END
+        """)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_delete
+        AFTER DELETE ON medicines
+        BEGIN {delete_row} END
+        """)
+        # Only searchable columns: stock movements must not rewrite the index
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_update
+        AFTER UPDATE OF {_FTS_COLUMNS} ON medicines
+        BEGIN {delete_row} {insert_row} END
+        """)
+
+        cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+# =========================
+# 5. Inventory paging indexes
+# =========================
+def _inventory_paging(cursor):
+    # Legacy tables had no DEFAULT 0; NULL stock breaks keyset comparisons
+    cursor.execute("UPDATE medicines SET units_in_stock = 0 WHERE units_in_stock IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicines_stock ON medicines(units_in_stock)")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_medicines_expiry_sort
+    ON medicines(COALESCE(expiry_iso, '9999-12-31'))
+    """)
+
+
+# =========================
+# 6. Receipt numbers
+# =========================
+def _receipt_numbers(cursor):
+    if not column_exists(cursor, "sales", "receipt_no"):
+        cursor.execute("ALTER TABLE sales ADD COLUMN receipt_no TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_receipt ON sales(receipt_no)")
+
+
+# =========================
+# 7. Batch / lot stock ledger
+# =========================
+def _stock_lots(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS stock_lots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medicine_id INTEGER NOT NULL,
+        batch_no TEXT,
+        expiry_iso TEXT,
+        qty_remaining INTEGER NOT NULL DEFAULT 0,
+        purchase_id INTEGER,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_stock_lots_medicine_expiry
+    ON stock_lots(medicine_id, expiry_iso)
+    """)
+    # Expiry reports only care about lots that still hold stock
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_stock_lots_open_expiry
+    ON stock_lots(expiry_iso) WHERE qty_remaining > 0
+    """)
+
+    if not column_exists(cursor, "purchases", "batch_no"):
+        cursor.execute("ALTER TABLE purchases ADD COLUMN batch_no TEXT")
+
+    # Today's stock becomes one opening lot per medicine
+    cursor.execute("""
+    INSERT INTO stock_lots (medicine_id, batch_no, expiry_iso, qty_remaining)
+    SELECT id, batch_no, expiry_iso, units_in_stock
+    FROM medicines
+    WHERE units_in_stock > 0
+    """)
+
+    cursor.execute("""
+    CREATE VIEW IF NOT EXISTS open_lots AS
+    SELECT l.id AS lot_id, l.medicine_id, m.name, m.strength, l.batch_no,
+           l.expiry_iso, l.qty_remaining, l.received_at
+    FROM stock_lots l
+    JOIN medicines m ON m.id = l.medicine_id
+    WHERE l.qty_remaining > 0
+    """)
+
+
+# =========================
+# 8. Daily sales rollup
+# =========================
+def _daily_sales_rollup(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS daily_sales_summary (
+        day TEXT NOT NULL,
+        sale_type TEXT NOT NULL,
+        medicine_id INTEGER NOT NULL,
+        tx_count INTEGER NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, sale_type, medicine_id)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_sales_rollup
+    AFTER INSERT ON sales
+    BEGIN
+        INSERT INTO daily_sales_summary (day, sale_type, medicine_id, tx_count, units, revenue)
+        VALUES (date(NEW.sale_date), COALESCE(NEW.sale_type, ''), COALESCE(NEW.medicine_id, 0),
+                1, COALESCE(NEW.quantity, 0), COALESCE(NEW.total_price, 0))
+        ON CONFLICT (day, sale_type, medicine_id) DO UPDATE SET
+            tx_count = tx_count + 1,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue;
+    END
+    """)
+
+    cursor.execute("""
+    INSERT INTO daily_sales_summary (day, sale_type, medicine_id, tx_count, units, revenue)
+    SELECT date(sale_date), COALESCE(sale_type, ''), COALESCE(medicine_id, 0),
+           COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(total_price), 0)
+    FROM sales
+    GROUP BY date(sale_date), COALESCE(sale_type, ''), COALESCE(medicine_id, 0)
+    """)
+
+
+# =========================
+# 9. Notification outbox
+# =========================
+def _notification_outbox(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient TEXT,
+        body TEXT NOT NULL,
+        kind TEXT,
+        coalesce_key TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_outbox_due
+    ON notification_outbox(status, next_attempt_at)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_outbox_coalesce
+    ON notification_outbox(coalesce_key) WHERE status = 'pending'
+    """)
+
+
+# =========================
+# 10. History export
+# =========================
+def _history_export(cursor):
+    # Date-range scans of purchases (exports) without reading the whole table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_purchases_date ON purchases(purchase_date)")
+
+
+# =========================
+# 11. Demand forecast
+# =========================
+def _demand_forecast(cursor):
+    # Maintained by forecast.py; forecast_state holds the last day folded in
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS demand_forecast (
+        medicine_id INTEGER PRIMARY KEY,
+        daily_demand REAL NOT NULL DEFAULT 0,
+        reorder_point INTEGER NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS forecast_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        through_day TEXT NOT NULL,
+        alpha REAL NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+# =========================
+# 12. History archive
+# =========================
+def _archive_state(cursor):
+    # archive.py: rows of table_name dated before archived_before may be in the archive file
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archive_state (
+        table_name TEXT PRIMARY KEY,
+        archived_before TEXT NOT NULL,
+        archived_rows INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+# =========================
+# 13. Shared data version
+# =========================
+def _shared_data_version(cursor):
+    # database.data_version(): bumped by every invalidating write, from any process
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+
+# =========================
+# 14. Daily receipt totals
+# =========================
+def _daily_sales_totals(cursor):
+    # One row per day: receipts (a checkout is one receipt, many sales rows) and revenue.
+    # Kept by trigger inside the sale's own transaction, like daily_sales_summary.
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS daily_sales_totals (
+        day TEXT PRIMARY KEY,
+        transactions INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """)
+
+    # A row opens a new transaction unless an earlier row carries its receipt_no
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_sales_totals
+    AFTER INSERT ON sales
+    BEGIN
+        INSERT INTO daily_sales_totals (day, transactions, revenue)
+        VALUES (
+            date(NEW.sale_date),
+            NEW.receipt_no IS NULL OR NOT EXISTS (
+                SELECT 1 FROM sales WHERE receipt_no = NEW.receipt_no AND id <> NEW.id
+            ),
+            COALESCE(NEW.total_price, 0)
+        )
+        ON CONFLICT (day) DO UPDATE SET
+            transactions = transactions + excluded.transactions,
+            revenue = revenue + excluded.revenue;
+    END
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO daily_sales_totals (day, transactions, revenue)
+    SELECT date(sale_date), COUNT(DISTINCT COALESCE(receipt_no, 'id:' || id)),
+           COALESCE(SUM(total_price), 0)
+    FROM sales
+    GROUP BY date(sale_date)
+    """)
+
+
+# =========================
+# 15. Catalog change tracking
+# =========================
+def _catalog_changes(cursor):
+    # catalog.py re-reads only medicines with changed_version above the data
+    # version it was loaded at. The triggers stamp rows with the version the
+    # running write transaction will bump to (database.bump_data_version).
+    if not column_exists(cursor, "medicines", "changed_version"):
+        cursor.execute("ALTER TABLE medicines ADD COLUMN changed_version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_medicines_changed ON medicines(changed_version)")
+
+    stamp = """
+        UPDATE medicines
+        SET changed_version = (SELECT version FROM data_version WHERE id = 1) + 1
+        WHERE id = {};
+    """
+    triggers = {
+        "trg_catalog_medicine_insert": ("AFTER INSERT ON medicines", "NEW.id"),
+        # The columns catalog.py caches
+        "trg_catalog_medicine_update": (
+            "AFTER UPDATE OF name, strength, form, barcode, batch_no, units_in_stock,"
+            " sell_price, sale_policy, expiry_iso ON medicines",
+            "NEW.id",
+        ),
+        "trg_catalog_forecast_insert": ("AFTER INSERT ON demand_forecast", "NEW.medicine_id"),
+        "trg_catalog_forecast_update": ("AFTER UPDATE OF reorder_point ON demand_forecast", "NEW.medicine_id"),
+        "trg_catalog_forecast_delete": ("AFTER DELETE ON demand_forecast", "OLD.medicine_id"),
+    }
+    for name, (event, medicine_id) in triggers.items():
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {name}
+        {event}
+        BEGIN
+            {stamp.format(medicine_id)}
+        END
+        """)
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline_schema),
+    (2, "secondary indexes", _secondary_indexes),
+    (3, "normalized expiry dates", _normalized_expiry),
+    (4, "full-text medicine search", _medicine_search),
+    (5, "inventory paging indexes", _inventory_paging),
+    (6, "receipt numbers", _receipt_numbers),
+    (7, "batch/lot stock ledger", _stock_lots),
+    (8, "daily sales rollup", _daily_sales_rollup),
+    (9, "notification outbox", _notification_outbox),
+    (10, "history export index", _history_export),
+    (11, "demand forecast", _demand_forecast),
+    (12, "history archive state", _archive_state),
+    (13, "shared data version", _shared_data_version),
+    (14, "daily receipt totals", _daily_sales_totals),
+    (15, "catalog change tracking", _catalog_changes),
+]
+
+
+# ======================================================
+# ------------------- RUNNER ---------------------------
+# ======================================================
+def current_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.commit()
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if version > current_version(conn):
+                step(conn.cursor())
+                conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                applied.append(version)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return applied
@@ -1,12 +1,25 @@
+import hashlib
+
 import streamlit as st
-from database import get_connection
-from datetime import datetime
+from catalog import get_catalog
+from bulk_import import apply_delivery, read_delivery, resolve_delivery
+from services import stock_in
+from writer import WriterStopped
 
 def purchases_screen():
     st.subheader("📥 Purchases (Stock In)")
 
-    conn = get_connection()
-    cur = conn.cursor()
+    tabs = st.tabs(["📥 Single Item", "📦 Bulk Delivery"])
+
+    with tabs[0]:
+        single_purchase_form()
+
+    with tabs[1]:
+        bulk_delivery_form()
+
+
+def single_purchase_form():
+    catalog = get_catalog()
 
     # --------------------
     # Step 1: Scan / Enter barcode
@@ -15,28 +28,21 @@ def purchases_screen():
 
     medicine = None
     if barcode_input:
-        cur.execute("SELECT id, name, units_in_stock FROM medicines WHERE barcode = ?", (barcode_input,))
-        medicine = cur.fetchone()
+        medicine = catalog.by_barcode.get(barcode_input)
 
     # --------------------
     # Step 2: Fallback manual search
     # --------------------
     if not medicine:
-        cur.execute("SELECT id, name FROM medicines ORDER BY name")
-        medicines = cur.fetchall()
-        if not medicines:
+        if not catalog.items:
             st.warning("No medicines found. Add medicines first.")
-            conn.close()
             return
 
-        med_dict = {name: mid for mid, name in medicines}
+        med_dict = catalog.id_by_name
         selected_name = st.selectbox("Or select medicine manually", med_dict.keys())
-        med_id = med_dict[selected_name]
+        medicine = catalog.get(med_dict[selected_name])
 
-        cur.execute("SELECT id, name, units_in_stock FROM medicines WHERE id = ?", (med_id,))
-        medicine = cur.fetchone()
-
-    med_id, med_name, current_stock = medicine
+    med_id, med_name, current_stock = medicine.id, medicine.name, medicine.units_in_stock
     st.write(f"Selected Medicine: **{med_name}**")
     st.write(f"Current Stock: {current_stock}")
 
@@ -46,22 +52,97 @@ def purchases_screen():
     quantity = st.number_input("Quantity Received (units/ml)", min_value=1)
     buy_price = st.number_input("Buy Price per unit", min_value=0.0)
     expiry_date = st.date_input("Expiry Date")
+    batch_no = st.text_input("Batch / Lot Number (optional)")
     supplier = st.text_input("Supplier (optional)")
 
     # --------------------
     # Step 4: Save purchase
     # --------------------
     if st.button("💾 Save Purchase"):
-        cur.execute("""
-            INSERT INTO purchases (medicine_id, quantity, buy_price, supplier, expiry_date, purchase_date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (med_id, quantity, buy_price, supplier, expiry_date, datetime.now()))
+        stock_in([{
+            "medicine_id": med_id,
+            "quantity": quantity,
+            "buy_price": buy_price,
+            "supplier": supplier,
+            "expiry_date": expiry_date,
+            "batch_no": batch_no,
+        }])
 
-        cur.execute("""
-            UPDATE medicines SET units_in_stock = units_in_stock + ? WHERE id = ?
-        """, (quantity, med_id))
+        st.success(f"Purchase recorded. New stock: {current_stock + quantity}")
 
-        conn.commit()
-        conn.close()
 
-        st.success(f"Purchase recorded. New stock: {current_stock + quantity}")
+# ==============================
+# 📦 BULK DELIVERY (CSV / Excel)
+# ==============================
+def bulk_delivery_form():
+    st.markdown("### Import Delivery Note")
+    st.caption(
+        "Columns: barcode or name, quantity, buy_price, expiry_date, "
+        "batch_no and supplier (optional). A name shared by several strengths "
+        "also needs a strength column."
+    )
+
+    upload = st.file_uploader("Delivery file", type=["csv", "xlsx"])
+    default_supplier = st.text_input("Supplier for lines without one", key="bulk_supplier")
+
+    if upload is None:
+        return
+
+    # A file stays in the uploader after it is applied; never book it twice
+    digest = hashlib.sha256(upload.getvalue()).hexdigest()
+    applied = st.session_state.setdefault("applied_deliveries", set())
+    if digest in applied:
+        st.info("✔ This delivery file has already been applied. Upload a new file to record another delivery.")
+        return
+
+    # Parse once per uploaded file, not on every rerun
+    parse_key = (upload.file_id, default_supplier)
+    if st.session_state.get("delivery_key") != parse_key:
+        try:
+            lines, errors = resolve_delivery(read_delivery(upload, upload.name), default_supplier)
+        except (ValueError, UnicodeDecodeError) as e:
+            st.error(f"Could not read file: {e}")
+            return
+        st.session_state.delivery_key = parse_key
+        st.session_state.delivery = (lines, errors)
+
+    lines, errors = st.session_state.delivery
+
+    if errors:
+        st.warning(f"{len(errors)} line(s) skipped")
+        st.dataframe(
+            {"Line": [e[0] for e in errors], "Problem": [e[1] for e in errors]},
+            hide_index=True,
+        )
+
+    if not lines:
+        st.info("No valid lines to import.")
+        return
+
+    st.markdown(f"**Preview — {len(lines)} line(s), {sum(l['quantity'] for l in lines)} units**")
+    st.dataframe(
+        {
+            "Line": [l["line_no"] for l in lines],
+            "Medicine": [l["name"] for l in lines],
+            "Quantity": [l["quantity"] for l in lines],
+            "Buy Price": [l["buy_price"] for l in lines],
+            "Expiry": [l["expiry_date"] for l in lines],
+            "Batch": [l["batch_no"] for l in lines],
+            "Supplier": [l["supplier"] for l in lines],
+        },
+        hide_index=True,
+        width="stretch",
+    )
+
+    if st.button("💾 Apply Delivery"):
+        try:
+            count = apply_delivery(lines)
+        except (TimeoutError, WriterStopped):
+            # It may still have been written; do not let a second click book it again
+            applied.add(digest)
+            st.warning("⚠️ Outcome unknown: check the stock levels before applying this file again.")
+            return
+        applied.add(digest)
+        st.session_state.pop("delivery_key", None)
+        st.session_state.pop("delivery", None)
+        st.success(f"Delivery recorded: {count} line(s).")
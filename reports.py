@@ -1,32 +1,51 @@
+import os
+from datetime import date
+
 import streamlit as st
-from database import get_connection
-from datetime import datetime, timedelta
+from export import FORMATS, HISTORY, PARQUET_ENABLED, export_history
+from forecast import DEFAULT_REORDER_POINT, LEAD_TIME_DAYS, SAFETY_DAYS
+from services import expiring, low_stock
+from snapshot import as_of_label, current_as_of
+from utils.whatsapp_notifier import send_expiry_digest, send_low_stock_digest
+
+# st.download_button holds the whole file in server memory while it is
+# served; larger exports are left on disk for the operator to collect
+DOWNLOAD_MAX_BYTES = 50 * 1024 * 1024
 
 def low_stock_report():
     st.subheader("🚨 Low Stock Alerts")
 
-    threshold = st.number_input(
-        "Low stock threshold",
-        min_value=1,
-        value=10
-    )
-
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    SELECT name, strength, units_in_stock
-    FROM medicines
-    WHERE units_in_stock <= ?
-    ORDER BY units_in_stock ASC
-    """, (threshold,))
+    # Each medicine against its own reorder point (forecast.py) by default
+    threshold = None
+    if st.checkbox("Use one fixed threshold instead of reorder points"):
+        threshold = st.number_input(
+            "Low stock threshold",
+            min_value=1,
+            value=DEFAULT_REORDER_POINT
+        )
+    else:
+        st.caption(
+            f"Reorder point = forecast daily demand × {LEAD_TIME_DAYS + SAFETY_DAYS} days "
+            f"({LEAD_TIME_DAYS} days lead time + {SAFETY_DAYS} safety). "
+            f"Medicines with no sales yet use {DEFAULT_REORDER_POINT} units."
+        )
 
-    rows = cursor.fetchall()
-    conn.close()
+    rows = low_stock(threshold)
+    st.caption(as_of_label(None))
 
     if rows:
         st.error("Low stock medicines detected!")
-        st.table(rows)
+        st.table({
+            "Medicine": [r[0] for r in rows],
+            "Strength": [r[1] for r in rows],
+            "In stock": [r[2] for r in rows],
+            "Reorder point": [r[3] for r in rows],
+            "Units / day": [r[4] for r in rows],
+            "Days of cover": [r[5] for r in rows],
+        })
+        if st.button("📲 Send low-stock digest"):
+            send_low_stock_digest(threshold)
+            st.success("Digest queued for WhatsApp.")
     else:
         st.success("All stock levels are healthy.")
 
@@ -38,32 +57,77 @@ def expiry_report():
         [30, 60, 90]
     )
 
-    today = datetime.today()
-    limit_date = today + timedelta(days=days)
+    as_of = current_as_of()
+    expired, lots, unreadable = expiring(days)
+    st.caption(as_of_label(as_of))
+
+    if expired:
+        st.error(f"{len(expired)} lot(s) have already expired. Remove them from the shelf; they cannot be sold.")
+        st.table({
+            "Medicine": [r[0] for r in expired],
+            "Strength": [r[1] for r in expired],
+            "Batch": [r[2] for r in expired],
+            "Expired": [r[3] for r in expired],
+            "Units": [r[4] for r in expired],
+        })
+
+    if lots:
+        st.warning("Medicines nearing expiry!")
+        st.table({
+            "Medicine": [r[0] for r in lots],
+            "Strength": [r[1] for r in lots],
+            "Batch": [r[2] for r in lots],
+            "Expiry": [r[3] for r in lots],
+            "Units": [r[4] for r in lots],
+        })
+        if st.button("📲 Send expiry digest"):
+            send_expiry_digest(days)
+            st.success("Digest queued for WhatsApp.")
+    else:
+        st.success("No medicines near expiry.")
 
-    conn = get_connection()
-    cursor = conn.cursor()
+    if unreadable:
+        st.error(f"{len(unreadable)} medicine(s) have an unreadable expiry date. Please correct them.")
+        st.table(unreadable)
 
-    cursor.execute("""
-    SELECT name, strength, expiry_date, units_in_stock
-    FROM medicines
-    WHERE expiry_date IS NOT NULL
-    """)
+def history_export():
+    st.subheader("📤 Export Sales / Purchase History")
+    st.caption("Streams the whole date range to a file in data/exports, chunk by chunk.")
 
-    rows = cursor.fetchall()
-    conn.close()
+    col1, col2, col3, col4 = st.columns(4)
+    kind = col1.selectbox("History", list(HISTORY))
+    start = col2.date_input("From", value=date.today().replace(month=1, day=1))
+    end = col3.date_input("To", value=date.today())
+    formats = [f for f in FORMATS if f != "parquet" or PARQUET_ENABLED]
+    fmt = col4.selectbox("Format", formats)
 
-    expiring = []
-    for name, strength, expiry, stock in rows:
+    if st.button("📤 Export"):
+        progress = st.empty()
         try:
-            exp_date = datetime.strptime(expiry, "%Y-%m-%d")
-            if exp_date <= limit_date:
-                expiring.append((name, strength, expiry, stock))
-        except:
-            continue
+            report = export_history(
+                kind, start, end, fmt,
+                on_chunk=lambda n: progress.caption(f"{n:,} rows written...")
+            )
+        except ValueError as e:
+            st.error(str(e))
+            return
+        progress.empty()
+        st.session_state.history_export = report
 
-    if expiring:
-        st.warning("Medicines nearing expiry!")
-        st.table(expiring)
-    else:
-        st.success("No medicines near expiry.")
+    report = st.session_state.get("history_export")
+    if report and os.path.exists(report["path"]):
+        st.success(f"{report['rows']:,} rows written to {report['path']} ({report['bytes'] / 1024:,.0f} KiB)")
+        if report["bytes"] > DOWNLOAD_MAX_BYTES:
+            st.info(
+                f"Too large to download in the browser (over {DOWNLOAD_MAX_BYTES // 1024 // 1024} MiB): "
+                "copy it from the server, or export a shorter range or csv.gz."
+            )
+        else:
+            path = report["path"]
+
+            def read_export():
+                # Read only when the button is pressed, not on every rerun
+                with open(path, "rb") as f:
+                    return f.read()
+
+            st.download_button("⬇️ Download export", read_export, file_name=os.path.basename(path))
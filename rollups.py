@@ -0,0 +1,90 @@
+import sys
+
+from archive import attach_archive, detach_archive
+from database import bump_data_version, get_connection, init_db
+
+# ======================================================
+# Daily sales rollup
+# ------------------------------------------------------
+# daily_sales_summary holds one row per (day, sale_type, medicine) and
+# daily_sales_totals one per day, counting receipts rather than sales rows.
+# The trg_sales_rollup / trg_sales_totals triggers (migrations.py) add every
+# new sales row to them inside the sale's own transaction, so every write
+# path is covered without extra code. Rows leaving the
+# sales table (archiving) are deliberately NOT subtracted: the rollup is
+# the full trading history.
+# ======================================================
+
+_REBUILD_FROM = """
+    SELECT date(sale_date), COALESCE(sale_type, ''), COALESCE(medicine_id, 0),
+           COUNT(*), COALESCE(SUM(quantity), 0), COALESCE(SUM(total_price), 0)
+    FROM {table}
+    WHERE true
+    GROUP BY date(sale_date), COALESCE(sale_type, ''), COALESCE(medicine_id, 0)
+"""
+
+_REBUILD_TOTALS_FROM = """
+    SELECT date(sale_date), COUNT(DISTINCT COALESCE(receipt_no, 'id:' || id)),
+           COALESCE(SUM(total_price), 0)
+    FROM {table}
+    WHERE true
+    GROUP BY date(sale_date)
+"""
+
+
+def rebuild_daily_summary(conn, tables=("sales",)):
+    # Recomputes the rollups from scratch; `tables` lets archived history be included
+    conn.execute("DELETE FROM daily_sales_summary")
+    conn.execute("DELETE FROM daily_sales_totals")
+    for table in tables:
+        conn.execute(f"""
+            INSERT INTO daily_sales_summary (day, sale_type, medicine_id, tx_count, units, revenue)
+            {_REBUILD_FROM.format(table=table)}
+            ON CONFLICT (day, sale_type, medicine_id) DO UPDATE SET
+                tx_count = tx_count + excluded.tx_count,
+                units = units + excluded.units,
+                revenue = revenue + excluded.revenue
+        """)
+        conn.execute(f"""
+            INSERT INTO daily_sales_totals (day, transactions, revenue)
+            {_REBUILD_TOTALS_FROM.format(table=table)}
+            ON CONFLICT (day) DO UPDATE SET
+                transactions = transactions + excluded.transactions,
+                revenue = revenue + excluded.revenue
+        """)
+
+
+def daily_totals(conn, limit=None):
+    # [(day, transactions, revenue)], newest first; a transaction is one receipt
+    sql = """
+        SELECT day, transactions, revenue
+        FROM daily_sales_totals
+        ORDER BY day DESC
+    """
+    if limit:
+        return conn.execute(sql + " LIMIT ?", (limit,)).fetchall()
+    return conn.execute(sql).fetchall()
+
+
+if __name__ == "__main__":
+    # python rollups.py --rebuild
+    if "--rebuild" not in sys.argv[1:]:
+        print("usage: python rollups.py --rebuild")
+        sys.exit(2)
+
+    init_db()
+    conn = get_connection()
+    try:
+        # Archived sales are part of the history too (archive.py)
+        source = "sales_history" if attach_archive(conn) else "sales"
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_daily_summary(conn, (source,))
+        days = conn.execute("SELECT COUNT(DISTINCT day) FROM daily_sales_summary").fetchone()[0]
+        bump_data_version(conn)
+        conn.commit()
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        detach_archive(conn)
+        conn.close()
+    print(f"daily_sales_summary rebuilt: {days} day(s)")
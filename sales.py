@@ -1,58 +1,42 @@
 import streamlit as st
-from database import get_connection
-from datetime import datetime, timedelta
-
-LOW_STOCK_THRESHOLD = 10
-NEAR_EXPIRY_DAYS = 30
+from cart import InsufficientStock, cart_total, checkout, make_line, quantity_in_cart
+from catalog import get_catalog, sale_label
+from database import DatabaseBusy
+from services import daily_sales, find_medicines, latest_receipt, sellable_stock
+from snapshot import as_of_label, current_as_of
+from stock import StockConflict
+from writer import WriterStopped
+from utils.expiry import NEAR_EXPIRY_DAYS, expiry_status
+
+
+def lot_expiry_state(item):
+    # FEFO sells the earliest unexpired lot; stock left only in expired lots is blocked
+    sellable, next_expiry = sellable_stock(item.id)
+    expired = item.units_in_stock > 0 and sellable <= 0
+    near_expiry = expiry_status(next_expiry) == "near"
+    if sellable and item.units_in_stock > sellable:
+        st.caption(f"🗑️ {item.units_in_stock - sellable} unit(s) are in expired lots and cannot be sold.")
+    return sellable, expired, near_expiry
 
 
 def quick_sale_screen():
     st.subheader("⚡ Quick Sale (OTC)")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
     # 🔍 Unified scanner / keyboard input
     search = st.text_input(
         "🔍 Scan barcode or type medicine name",
         placeholder="Scan or type here..."
     )
 
-    medicines = []
-
-    if search:
-        cursor.execute("""
-        SELECT id, name, strength, units_in_stock, sell_price, sale_policy, expiry_date
-        FROM medicines
-        WHERE
-            barcode = ?
-            OR name LIKE ?
-            OR strength LIKE ?
-        ORDER BY name
-        """, (
-            search,
-            f"%{search}%",
-            f"%{search}%"
-        ))
-        medicines = cursor.fetchall()
-    else:
-        cursor.execute("""
-        SELECT id, name, strength, units_in_stock, sell_price, sale_policy, expiry_date
-        FROM medicines
-        ORDER BY name
-        """)
-        medicines = cursor.fetchall()
+    # Exact barcode, then ranked full-text matches (services.py / search.py)
+    medicines = find_medicines(search)
 
     if not medicines:
         st.warning("❌ Medicine not found.")
-        conn.close()
         return
 
     # ---- AUTO-SELECT LOGIC ----
-    med_map = {}
-    for mid, name, strength, stock, price, policy, expiry in medicines:
-        label = f"{name} {strength} (Stock: {stock})"
-        med_map[label] = (mid, stock, price, policy, expiry)
+    med_map = {sale_label(item): item for item in medicines}
 
     if len(med_map) == 1:
         selected = list(med_map.keys())[0]
@@ -60,40 +44,34 @@ def quick_sale_screen():
     else:
         selected = st.selectbox("Select Medicine", med_map.keys())
 
-    med_id, stock, price, policy, expiry = med_map[selected]
-
-    today = datetime.today().date()
+    item = med_map[selected]
+    med_id, stock, price, policy = item.id, item.units_in_stock, item.sell_price, item.sale_policy
 
     # ---- EXPIRY LOGIC ----
-    expired = False
-    near_expiry = False
-
-    if expiry:
-        try:
-            exp_date = datetime.strptime(expiry, "%Y-%m-%d").date()
-            if exp_date < today:
-                expired = True
-            elif exp_date <= today + timedelta(days=NEAR_EXPIRY_DAYS):
-                near_expiry = True
-        except:
-            pass
+    sellable, expired, near_expiry = lot_expiry_state(item)
 
     # ---- WARNINGS ----
     if expired:
         st.error("❌ EXPIRED MEDICINE — SALE BLOCKED")
     elif near_expiry:
-        st.warning("⚠️ Near expiry (≤30 days)")
+        st.warning(f"⚠️ Near expiry (≤{NEAR_EXPIRY_DAYS} days)")
 
     if stock <= 0:
         st.error("❌ OUT OF STOCK — SALE BLOCKED")
-    elif stock <= LOW_STOCK_THRESHOLD:
+    elif stock <= item.reorder_point:
         st.warning("⚠️ Low stock warning")
 
+    # Units already in the basket are not available for another line
+    cart = get_cart()
+    available = sellable - quantity_in_cart(cart, med_id)
+    if stock > 0 and available <= 0:
+        st.warning("🛒 All available stock is already in the cart.")
+
     quantity = st.number_input(
         "Quantity (units/ml)",
         min_value=1,
-        max_value=stock if stock > 0 else 1,
-        disabled=expired or stock <= 0
+        max_value=available if available > 0 else 1,
+        disabled=expired or available <= 0
     )
 
     total = quantity * price
@@ -102,26 +80,16 @@ def quick_sale_screen():
     if policy == "PRESCRIPTION":
         st.info("ℹ️ Prescription-only medicine. Confirm prescription.")
 
-    can_sell = not expired and stock > 0
+    can_sell = not expired and available > 0
 
-    if st.button("✅ SELL", disabled=not can_sell):
-        if quantity > stock:
+    if st.button("➕ ADD TO CART", disabled=not can_sell):
+        if quantity > available:
             st.error("Not enough stock.")
         else:
-            cursor.execute("""
-            INSERT INTO sales (medicine_id, quantity, sale_type, total_price)
-            VALUES (?, ?, 'QUICK', ?)
-            """, (med_id, quantity, total))
-
-            cursor.execute("""
-            UPDATE medicines
-            SET units_in_stock = units_in_stock - ?
-            WHERE id = ?
-            """, (quantity, med_id))
+            cart.append(make_line(med_id, f"{item.name} {item.strength}", quantity, "QUICK", price))
+            st.rerun()
 
-            conn.commit()
-            conn.close()
-            st.success("Sale completed successfully.")
+    cart_panel()
 
 # ==============================
 # 🧪 DOSAGE SALE (PRESCRIPTION)
@@ -129,57 +97,35 @@ def quick_sale_screen():
 def dosage_sale_screen():
     st.subheader("🧪 Dosage Sale (Prescription)")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    SELECT id, name, strength, units_in_stock, sell_price, expiry_date
-    FROM medicines
-    WHERE sale_policy = 'PRESCRIPTION'
-    ORDER BY name
-    """)
-    meds = cursor.fetchall()
+    med_map = get_catalog().sale_labels("PRESCRIPTION")
 
-    if not meds:
+    if not med_map:
         st.info("No prescription medicines available.")
-        conn.close()
         return
 
-    med_map = {}
-    for mid, name, strength, stock, price, expiry in meds:
-        label = f"{name} {strength} (Stock: {stock})"
-        med_map[label] = (mid, stock, price, expiry)
-
     selected = st.selectbox("Select Medicine", med_map.keys())
-    med_id, stock, price, expiry = med_map[selected]
-
-    today = datetime.today().date()
-    expired = False
-    near_expiry = False
-
-    if expiry:
-        try:
-            exp_date = datetime.strptime(expiry, "%Y-%m-%d").date()
-            if exp_date < today:
-                expired = True
-            elif exp_date <= today + timedelta(days=NEAR_EXPIRY_DAYS):
-                near_expiry = True
-        except:
-            pass
+    item = med_map[selected]
+    med_id, stock, price = item.id, item.units_in_stock, item.sell_price
+
+    sellable, expired, near_expiry = lot_expiry_state(item)
 
     if expired:
         st.error("❌ EXPIRED MEDICINE — SALE BLOCKED")
     elif near_expiry:
-        st.warning("⚠️ Near expiry (≤30 days)")
+        st.warning(f"⚠️ Near expiry (≤{NEAR_EXPIRY_DAYS} days)")
 
     if stock <= 0:
         st.error("❌ OUT OF STOCK — SALE BLOCKED")
-    elif stock <= LOW_STOCK_THRESHOLD:
+    elif stock <= item.reorder_point:
         st.warning("⚠️ Low stock warning")
 
-    dose = st.number_input("Dose per intake (units/ml)", min_value=1, disabled=expired or stock <= 0)
-    frequency = st.number_input("Times per day", min_value=1, disabled=expired or stock <= 0)
-    days = st.number_input("Number of days", min_value=1, disabled=expired or stock <= 0)
+    cart = get_cart()
+    available = sellable - quantity_in_cart(cart, med_id)
+    blocked = expired or available <= 0
+
+    dose = st.number_input("Dose per intake (units/ml)", min_value=1, disabled=blocked)
+    frequency = st.number_input("Times per day", min_value=1, disabled=blocked)
+    days = st.number_input("Number of days", min_value=1, disabled=blocked)
 
     total_units = dose * frequency * days
     total_price = total_units * price
@@ -187,26 +133,80 @@ def dosage_sale_screen():
     st.markdown(f"### 📦 Total Units: {total_units}")
     st.markdown(f"### 💵 Total Price: KES {total_price}")
 
-    if total_units > stock:
+    if total_units > available:
         st.error("Not enough stock available.")
 
-    can_sell = not expired and stock > 0 and total_units <= stock
+    can_sell = not expired and available > 0 and total_units <= available
+
+    if st.button("➕ ADD DOSAGE TO CART", disabled=not can_sell):
+        cart.append(make_line(med_id, f"{item.name} {item.strength}", total_units, "DOSAGE", price))
+        st.rerun()
 
-    if st.button("✅ COMPLETE DOSAGE SALE", disabled=not can_sell):
-        cursor.execute("""
-        INSERT INTO sales (medicine_id, quantity, sale_type, total_price)
-        VALUES (?, ?, 'DOSAGE', ?)
-        """, (med_id, total_units, total_price))
+    cart_panel()
 
-        cursor.execute("""
-        UPDATE medicines
-        SET units_in_stock = units_in_stock - ?
-        WHERE id = ?
-        """, (total_units, med_id))
 
-        conn.commit()
-        conn.close()
-        st.success("Dosage sale completed.")
+# ==============================
+# 🛒 CART
+# ==============================
+def get_cart():
+    if "cart" not in st.session_state:
+        st.session_state.cart = []
+    return st.session_state.cart
+
+
+def cart_panel():
+    cart = get_cart()
+
+    st.divider()
+    st.markdown("### 🛒 Cart")
+
+    if "checkout_message" in st.session_state:
+        st.success(st.session_state.pop("checkout_message"))
+
+    if not cart:
+        st.caption("Cart is empty.")
+        return
+
+    st.table({
+        "Medicine": [line["label"] for line in cart],
+        "Quantity": [line["quantity"] for line in cart],
+        "Sale Type": [line["sale_type"] for line in cart],
+        "Total (KES)": [line["total"] for line in cart],
+    })
+    st.markdown(f"### 💵 Cart Total: KES {cart_total(cart)}")
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        if st.button("✅ CHECKOUT"):
+            try:
+                receipt_no = checkout(cart)
+            except InsufficientStock as e:
+                st.error(f"❌ Not enough stock: {e}")
+            except DatabaseBusy:
+                st.error("⏳ Another till is saving a sale. Please press checkout again.")
+            except StockConflict as e:
+                st.error(f"❌ {e}")
+            except (TimeoutError, WriterStopped):
+                # The sale may still have been committed; a blind retry could sell it twice
+                st.warning(
+                    "⚠️ Outcome unknown: the sale could not be confirmed. Check the Receipt "
+                    "or Daily Report before pressing checkout again."
+                )
+            else:
+                cart.clear()
+                st.session_state.checkout_message = f"Sale completed. Receipt {receipt_no}"
+                st.rerun()
+
+    with col2:
+        if st.button("↩️ Remove last line"):
+            cart.pop()
+            st.rerun()
+
+    with col3:
+        if st.button("🗑️ Clear cart"):
+            cart.clear()
+            st.rerun()
 
 
 # ==============================
@@ -215,34 +215,26 @@ def dosage_sale_screen():
 def sales_receipt_screen():
     st.subheader("🧾 Sales Receipt")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    SELECT s.id, m.name, s.quantity, s.sale_type, s.total_price, s.sale_date
-    FROM sales s
-    JOIN medicines m ON s.medicine_id = m.id
-    ORDER BY s.sale_date DESC
-    LIMIT 1
-    """)
-
-    sale = cursor.fetchone()
-    conn.close()
+    receipt = latest_receipt()
 
-    if not sale:
+    if not receipt or not receipt[2]:
         st.info("No sales yet.")
         return
+    ref, date, lines = receipt
 
-    sid, name, qty, stype, total, date = sale
+    items = "\n".join(
+        f"{name} {strength or ''}\n  {qty} x ({stype})  KES {total}"
+        for name, strength, qty, stype, total in lines
+    )
+    grand_total = sum(line[4] for line in lines)
 
     receipt = f"""
 🏥 i_dawa_app RECEIPT
+Receipt: {ref}
 --------------------------
-Medicine: {name}
-Quantity: {qty}
-Sale Type: {stype}
+{items}
 --------------------------
-TOTAL: KES {total}
+TOTAL: KES {grand_total}
 Date: {date}
 --------------------------
 Thank you!
@@ -253,7 +245,7 @@ Thank you!
     st.download_button(
         "⬇️ Download Receipt",
         receipt,
-        file_name=f"receipt_{sid}.txt"
+        file_name=f"receipt_{ref}.txt"
     )
 
 
@@ -263,18 +255,10 @@ Thank you!
 def daily_sales_report():
     st.subheader("📊 Daily Sales Report")
 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    SELECT DATE(sale_date), COUNT(*), SUM(total_price)
-    FROM sales
-    GROUP BY DATE(sale_date)
-    ORDER BY DATE(sale_date) DESC
-    """)
-
-    rows = cursor.fetchall()
-    conn.close()
+    # Read from the incrementally maintained rollup, not the sales history
+    as_of = current_as_of()
+    rows = daily_sales()
+    st.caption(as_of_label(as_of))
 
     if not rows:
         st.info("No sales records found.")
@@ -0,0 +1,47 @@
+import threading
+from datetime import datetime, timezone
+
+from database import data_version, get_connection
+
+# ======================================================
+# Live "sales today" counter
+# ------------------------------------------------------
+# (transactions, revenue) for the current UTC day, where a transaction is
+# one receipt. The count is kept in daily_sales_totals by a trigger that
+# runs inside the sale's own commit (migrations.py), so it covers every
+# till and process. This module caches that row and re-reads it (a
+# primary key lookup) only when database.data_version() moves, i.e. after
+# a write from any process. sale_date is CURRENT_TIMESTAMP, i.e. UTC, so
+# days here are UTC days as well.
+# ======================================================
+
+_lock = threading.Lock()
+_cached = {"key": None, "total": (0, 0)}   # key: ('YYYY-MM-DD', data version)
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date()
+
+
+def query_day_total(conn, day):
+    row = conn.execute(
+        "SELECT transactions, revenue FROM daily_sales_totals WHERE day = ?", (day.isoformat(),)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def today_total():
+    # (transactions, revenue) for the current UTC day; no query until data changes
+    key = (utc_today().isoformat(), data_version())
+    with _lock:
+        if _cached["key"] == key:
+            return _cached["total"]
+
+    conn = get_connection()
+    try:
+        total = query_day_total(conn, utc_today())
+    finally:
+        conn.close()
+    with _lock:
+        _cached.update(key=key, total=total)
+    return total
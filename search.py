@@ -0,0 +1,99 @@
+import re
+
+# ======================================================
+# Medicine search (FTS5)
+# ------------------------------------------------------
+# medicines_fts  : word-prefix index, bm25 ranked ("pan" -> Panadol)
+# medicines_trgm : trigram index for infix matches ("xicil" -> Amoxicillin)
+# Both are external-content tables over medicines, kept in sync by the
+# triggers created in migrations.py.
+# ======================================================
+
+SEARCH_LIMIT = 50
+SEARCH_COLUMNS = ("name", "strength", "form", "batch_no", "barcode")
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _prefix_query(text):
+    tokens = _TOKEN.findall(text.lower())
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _trigram_query(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def match_filter(text, column="id"):
+    # (sql, params) restricting `column` to every medicine search_medicine_ids
+    # would find (per-token prefixes or a trigram infix match), or None
+    text = (text or "").strip()
+    clauses, params = [], []
+    prefix = _prefix_query(text)
+    if prefix:
+        clauses.append(f"{column} IN (SELECT rowid FROM medicines_fts WHERE medicines_fts MATCH ?)")
+        params.append(prefix)
+    if len(text) >= 3:
+        clauses.append(f"{column} IN (SELECT rowid FROM medicines_trgm WHERE medicines_trgm MATCH ?)")
+        params.append(_trigram_query(text))
+    if not clauses:
+        return None
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def search_medicine_ids(conn, text, limit=SEARCH_LIMIT):
+    text = (text or "").strip()
+    if not text:
+        return []
+
+    cur = conn.cursor()
+
+    # Scanner input: an exact barcode hit is the only answer
+    cur.execute("SELECT id FROM medicines WHERE barcode = ?", (text,))
+    row = cur.fetchone()
+    if row:
+        return [row[0]]
+
+    ids = []
+    prefix = _prefix_query(text)
+    if prefix:
+        cur.execute("""
+            SELECT rowid FROM medicines_fts
+            WHERE medicines_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (prefix, limit))
+        ids = [r[0] for r in cur.fetchall()]
+
+    # Trigrams need at least three characters
+    if len(ids) < limit and len(text) >= 3:
+        seen = set(ids)
+        cur.execute("""
+            SELECT rowid FROM medicines_trgm
+            WHERE medicines_trgm MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (_trigram_query(text), limit))
+        for (mid,) in cur.fetchall():
+            if mid not in seen and len(ids) < limit:
+                ids.append(mid)
+                seen.add(mid)
+
+    return ids
+
+
+def search_medicines(conn, text, columns="id, name", limit=SEARCH_LIMIT):
+    # Rows for `columns`, best match first
+    ids = search_medicine_ids(conn, text, limit)
+    if not ids:
+        return []
+
+    placeholders = ", ".join("?" for _ in ids)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT id, {columns}
+        FROM medicines
+        WHERE id IN ({placeholders})
+    """, ids)
+    by_id = {r[0]: r[1:] for r in cur.fetchall()}
+    return [by_id[mid] for mid in ids if mid in by_id]
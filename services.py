@@ -0,0 +1,270 @@
+import sqlite3
+
+from cart import SALE_TYPES, checkout, make_line
+from catalog import get_catalog
+from database import get_connection, write_transaction
+from forecast import refresh_forecast, reorder_list
+from rollups import daily_totals
+from sales_counter import today_total
+from snapshot import reporting_connection
+from search import SEARCH_LIMIT, search_medicine_ids
+from stock import lot_stock, receive_stock
+from utils.expiry import already_expired, expiring_within, lot_expiry, parse_expiry, unreadable_expiry
+from writer import execute
+
+# ======================================================
+# Service layer
+# ------------------------------------------------------
+# Everything a till needs, with no Streamlit in sight: the screens call
+# these functions and so does the HTTP API (api.py) used by scanners and
+# headless tills. Reads come from the catalog cache where possible;
+# sales and deliveries go through the group-commit writer (writer.py) and
+# catalog edits through write_transaction(), so both front ends share the
+# same validation, stock rules and cache invalidation. Reports read the
+# read-only reporting snapshot (snapshot.py), so they may be a few minutes
+# behind the tills.
+# ======================================================
+
+SALE_POLICIES = ("OTC", "ADVICE", "PRESCRIPTION")
+
+
+class DuplicateBarcode(Exception):
+    pass
+
+
+class UnknownMedicine(Exception):
+    pass
+
+
+# ==============================
+# 🔍 CATALOG
+# ==============================
+def find_medicines(text="", limit=SEARCH_LIMIT):
+    # [CatalogItem]: exact barcode, then ranked full-text matches; the whole catalog when empty
+    catalog = get_catalog()
+    if not text:
+        return catalog.items
+
+    conn = get_connection()
+    ids = search_medicine_ids(conn, text, limit)
+    conn.close()
+    return [catalog.by_id[mid] for mid in ids if mid in catalog.by_id]
+
+
+def get_medicine(medicine_id):
+    item = get_catalog().get(medicine_id)
+    if item is None:
+        raise UnknownMedicine(f"No medicine with id {medicine_id}")
+    return item
+
+
+def lookup_barcode(barcode):
+    return get_catalog().by_barcode.get(barcode)
+
+
+def barcode_cleanups():
+    # [(medicine_id, name, strength, barcode, kept_medicine_id, cleared_at)] that
+    # the barcode index migration took a duplicate barcode from, not yet reviewed
+    conn = get_connection()
+    try:
+        return conn.execute("""
+            SELECT medicine_id, name, strength, barcode, kept_medicine_id, cleared_at
+            FROM barcode_cleanups
+            WHERE reviewed = 0
+            ORDER BY barcode, medicine_id
+        """).fetchall()
+    except sqlite3.OperationalError:
+        return []   # no duplicates were ever found: the table does not exist
+    finally:
+        conn.close()
+
+
+def mark_barcode_cleanups_reviewed():
+    with write_transaction(invalidate=False) as conn:
+        conn.execute("UPDATE barcode_cleanups SET reviewed = 1 WHERE reviewed = 0")
+
+
+def sellable_stock(medicine_id):
+    # (units in unexpired lots, earliest unexpired lot expiry); read live, not cached
+    conn = get_connection()
+    try:
+        return lot_stock(conn, [medicine_id])[medicine_id]
+    finally:
+        conn.close()
+
+
+def add_medicine(name, strength="", form="", unit_type=None, units_per_pack=None,
+                 expiry_date=None, buy_price=0.0, sell_price=0.0, sale_policy="OTC",
+                 barcode=None, batch_no=None):
+    if not name:
+        raise ValueError("Medicine name is required")
+    if sale_policy not in SALE_POLICIES:
+        raise ValueError(f"sale_policy must be one of {', '.join(SALE_POLICIES)}")
+
+    try:
+        with write_transaction() as conn:
+            cur = conn.execute("""
+            INSERT INTO medicines
+            (barcode, name, batch_no, strength, form, unit_type,
+             units_per_pack, units_in_stock, expiry_date,
+             buy_price, sell_price, sale_policy)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)
+            """, (
+                barcode or None, name, batch_no, strength, form, unit_type,
+                units_per_pack, parse_expiry(expiry_date) or expiry_date,
+                buy_price, sell_price, sale_policy
+            ))
+    except sqlite3.IntegrityError:
+        # Unique index on medicines(barcode)
+        raise DuplicateBarcode(f"Barcode {barcode} already exists in inventory")
+    return cur.lastrowid
+
+
+# ==============================
+# 💊 SELL
+# ==============================
+def _check_lines(lines):
+    if not isinstance(lines, list) or not lines or not all(isinstance(line, dict) for line in lines):
+        raise ValueError("lines must be a non-empty list of objects")
+
+
+def sell(lines):
+    # lines: [{"medicine_id" or "barcode", "quantity", "sale_type"?}]
+    # Returns the receipt number; raises cart.InsufficientStock when short.
+    # Lines are priced from the catalog, as on the screens; a client price is refused.
+    _check_lines(lines)
+    catalog = get_catalog()
+    cart = []
+    for line in lines:
+        if "unit_price" in line:
+            raise ValueError("unit_price is not accepted; lines are priced from the catalog")
+        if line.get("medicine_id") is not None:
+            key, value = "id", int(line["medicine_id"])
+            item = catalog.get(value)
+        else:
+            key, value = "barcode", line.get("barcode")
+            item = catalog.by_barcode.get(value)
+        if item is None:
+            raise UnknownMedicine(f"No medicine with {key} {value}")
+
+        quantity = int(line.get("quantity", 1))
+        if quantity < 1:
+            raise ValueError(f"{item.name}: quantity must be at least 1")
+
+        sale_type = line.get("sale_type", "QUICK")
+        if sale_type not in SALE_TYPES:
+            raise ValueError(f"sale_type must be one of {', '.join(SALE_TYPES)}")
+        # The Dosage Sale screen only offers prescription medicines
+        if sale_type == "DOSAGE" and item.sale_policy != "PRESCRIPTION":
+            raise ValueError(f"{item.name}: DOSAGE sales are for prescription medicines only")
+
+        cart.append(make_line(item.id, f"{item.name} {item.strength}", quantity, sale_type, item.sell_price))
+    return checkout(cart)
+
+
+# ==============================
+# 📥 STOCK IN
+# ==============================
+def stock_in(lines, default_supplier=""):
+    # lines: [{"medicine_id", "quantity", "buy_price"?, "expiry_date", "batch_no"?, "supplier"?}]
+    # Returns the new purchase ids.
+    _check_lines(lines)
+    clean = []
+    for line in lines:
+        item = get_medicine(int(line["medicine_id"]))
+        quantity = int(line["quantity"])
+        if quantity < 1:
+            raise ValueError(f"{item.name}: quantity must be at least 1")
+        try:
+            expiry = lot_expiry(line.get("expiry_date"))
+        except ValueError as e:
+            raise ValueError(f"{item.name}: {e}") from None
+
+        clean.append({
+            "medicine_id": item.id,
+            "quantity": quantity,
+            "buy_price": float(line.get("buy_price") or 0),
+            "supplier": line.get("supplier") or default_supplier,
+            "expiry_date": expiry,
+            "batch_no": (line.get("batch_no") or "").strip() or None,
+        })
+
+    return execute(lambda conn: receive_stock(conn, clean))
+
+
+# ==============================
+# 📊 REPORTS
+# ==============================
+def low_stock(threshold=None, limit=None):
+    # [(name, strength, units_in_stock, reorder_point, daily_demand, days_of_cover)],
+    # least cover first. Each medicine is compared with its forecast reorder
+    # point (forecast.py) unless a fixed threshold is given. Read live: the
+    # forecast was just refreshed and the snapshot may predate it.
+    refresh_forecast()
+    conn = get_connection()
+    rows = reorder_list(conn, threshold, limit)
+    conn.close()
+    return rows
+
+
+def expiring(days=30):
+    # (expired lots, lots expiring within `days`, unreadable medicine expiries):
+    # lots are [(name, strength, batch_no, expiry_iso, qty_remaining)],
+    # unreadable [(name, strength, expiry_date)]
+    conn, _ = reporting_connection()
+    expired = already_expired(conn)
+    lots = expiring_within(conn, days, include_expired=False)
+    unreadable = unreadable_expiry(conn)
+    conn.close()
+    return expired, lots, unreadable
+
+
+def daily_sales(limit=None):
+    # [(day, transactions, revenue)], newest first
+    conn, _ = reporting_connection()
+    rows = daily_totals(conn, limit)
+    conn.close()
+    return rows
+
+
+def sales_today():
+    # (transactions, revenue) for the current UTC day; one transaction per receipt
+    return today_total()
+
+
+def latest_receipt():
+    # (receipt reference, date, [(name, strength, qty, sale_type, total)]) or None
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+    SELECT id, receipt_no, sale_date
+    FROM sales
+    ORDER BY sale_date DESC, id DESC
+    LIMIT 1
+    """)
+    last = cursor.fetchone()
+    if not last:
+        conn.close()
+        return None
+
+    sid, receipt_no, date = last
+    # Sales made before the cart existed have no receipt number
+    if receipt_no:
+        cursor.execute("""
+        SELECT m.name, m.strength, s.quantity, s.sale_type, s.total_price
+        FROM sales s
+        JOIN medicines m ON s.medicine_id = m.id
+        WHERE s.receipt_no = ?
+        ORDER BY s.id
+        """, (receipt_no,))
+    else:
+        cursor.execute("""
+        SELECT m.name, m.strength, s.quantity, s.sale_type, s.total_price
+        FROM sales s
+        JOIN medicines m ON s.medicine_id = m.id
+        WHERE s.id = ?
+        """, (sid,))
+    lines = cursor.fetchall()
+    conn.close()
+    return receipt_no or sid, date, lines
@@ -0,0 +1,136 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import database
+from backup import copy_database
+from database import get_connection
+from diagnostics import TimedConnection, count
+
+# ======================================================
+# Read-only reporting snapshot
+# ------------------------------------------------------
+# The reports, the dashboard, the daily sales report and Dawa AI's stock
+# and expiry answers read from a copy of the database
+# (data/i_dawa_reporting.db), not the file the tills write to. The copy is
+# taken with the same paced backup API as backups (backup.py) and swapped
+# in with os.replace, so a long report scans a file no till ever writes
+# and never holds back WAL checkpoints on the live one.
+#
+# A copy older than SNAPSHOT_MAX_AGE_SECONDS is refreshed in a background
+# thread while the old one keeps serving, and screens show when the copy
+# they read was taken and whether the last refresh failed (as_of_label;
+# failures are also logged). Until this process has made its first
+# copy, reports read the live database. REPORTING_FROM_SNAPSHOT = False
+# turns the mode off.
+# ======================================================
+
+REPORTING_FROM_SNAPSHOT = True
+SNAPSHOT_MAX_AGE_SECONDS = 300
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()    # one copy at a time
+_state = {"source": None, "as_of": None, "refreshing": False, "error": None}
+
+log = logging.getLogger(__name__)
+
+
+def snapshot_path():
+    return os.path.splitext(database.DB_PATH)[0] + "_reporting.db"
+
+
+def refresh_snapshot():
+    # Copies the live database into the snapshot; returns when the copy began (UTC)
+    with _refresh_lock:
+        source = database.DB_PATH
+        path = snapshot_path()
+        partial = path + ".partial"
+        began = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            copy_database(source, partial)
+            os.replace(partial, path)
+        except BaseException as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            with _lock:
+                _state["error"] = str(e)
+            raise
+        count("snapshot.refresh", (time.perf_counter() - started) * 1000)
+        with _lock:
+            _state.update(source=source, as_of=began, error=None)
+        return began
+
+
+def _refresh_quietly():
+    try:
+        refresh_snapshot()
+    except Exception:
+        # Keep serving the previous copy (or the live database); as_of_label shows the error
+        log.exception("Reporting snapshot refresh failed")
+    finally:
+        with _lock:
+            _state["refreshing"] = False
+
+
+def current_as_of():
+    # UTC time of the copy reports read now; None while they read the live database
+    if not REPORTING_FROM_SNAPSHOT:
+        return None
+    with _lock:
+        return _state["as_of"] if _state["source"] == database.DB_PATH else None
+
+
+def _refresh_if_stale():
+    as_of = current_as_of()
+    stale = as_of is None or (datetime.now(timezone.utc) - as_of).total_seconds() > SNAPSHOT_MAX_AGE_SECONDS
+    if stale:
+        with _lock:
+            if not _state["refreshing"]:
+                _state["refreshing"] = True
+                threading.Thread(target=_refresh_quietly, name="reporting-snapshot", daemon=True).start()
+    return as_of
+
+
+def reporting_connection():
+    # (conn, as_of): a read-only connection to the snapshot and when it was
+    # taken, or a live pooled connection and None. Close conn when done.
+    if not REPORTING_FROM_SNAPSHOT:
+        return get_connection(), None
+    as_of = _refresh_if_stale()
+    if as_of is None:
+        return get_connection(), None
+
+    # immutable: no locks at all; a refresh replaces the file, never changes it
+    conn = sqlite3.connect(
+        f"file:{quote(os.path.abspath(snapshot_path()))}?mode=ro&immutable=1",
+        uri=True,
+        check_same_thread=False,
+        factory=TimedConnection,
+    )
+    conn.execute(f"PRAGMA mmap_size = {database.MMAP_SIZE}")
+    return conn, as_of
+
+
+def refresh_error():
+    # Why the latest snapshot refresh failed, or None
+    with _lock:
+        return _state["error"]
+
+
+def as_of_label(as_of=None):
+    # Read as_of before the figures it labels, so the label is never newer than they are
+    if as_of is None:
+        label = "Live figures."
+    else:
+        minutes = int((datetime.now(timezone.utc) - as_of).total_seconds() // 60)
+        ago = "just now" if minutes < 1 else f"{minutes} min ago"
+        label = f"Figures as of {as_of:%H:%M:%S} UTC ({ago}); refreshed every {SNAPSHOT_MAX_AGE_SECONDS // 60} min."
+    error = refresh_error() if REPORTING_FROM_SNAPSHOT else None
+    if error:
+        label += f" ⚠️ Last snapshot refresh failed: {error}"
+    return label
@@ -0,0 +1,158 @@
+from datetime import date, datetime
+
+# ======================================================
+# Stock movements (batch / lot level)
+# ------------------------------------------------------
+# stock_lots holds what is physically on the shelf per batch. Purchases
+# add a lot, sales take from the lot that expires first (FEFO), skipping
+# expired lots. medicines.units_in_stock is kept equal to the sum of all
+# lots and medicines.expiry_date to the earliest open lot, so the indexed
+# medicine-level queries stay valid.
+#
+# Every function takes a connection that is already inside a write
+# transaction (database.write_transaction()).
+# ======================================================
+
+
+def _today_iso(today=None):
+    return (today or date.today()).isoformat()
+
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+
+def sync_medicine_expiry(conn, medicine_ids):
+    # Earliest open lot, falling back to the catalog value once every lot is empty
+    conn.executemany("""
+        UPDATE medicines
+        SET expiry_date = COALESCE((
+            SELECT MIN(expiry_iso) FROM stock_lots
+            WHERE medicine_id = medicines.id AND qty_remaining > 0
+        ), expiry_date)
+        WHERE id = ?
+    """, [(mid,) for mid in medicine_ids])
+
+
+# ==============================
+# 📥 STOCK IN
+# ==============================
+def receive_stock(conn, lines, purchase_date=None):
+    # lines: dicts with medicine_id, quantity, buy_price, supplier, expiry_date (ISO), batch_no
+    if not lines:
+        return []
+
+    purchase_date = purchase_date or datetime.now()
+    conn.executemany("""
+        INSERT INTO purchases
+        (medicine_id, quantity, buy_price, supplier, expiry_date, batch_no, purchase_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (l["medicine_id"], l["quantity"], l["buy_price"], l["supplier"],
+         l["expiry_date"], l["batch_no"], purchase_date)
+        for l in lines
+    ])
+
+    # The write lock is held and purchases uses AUTOINCREMENT, so the rows
+    # just inserted have consecutive ids ending at last_insert_rowid().
+    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    purchase_ids = list(range(last_id - len(lines) + 1, last_id + 1))
+
+    conn.executemany("""
+        INSERT INTO stock_lots (medicine_id, batch_no, expiry_iso, qty_remaining, purchase_id)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (l["medicine_id"], l["batch_no"], l["expiry_date"], l["quantity"], pid)
+        for l, pid in zip(lines, purchase_ids)
+    ])
+
+    units = {}
+    for l in lines:
+        units[l["medicine_id"]] = units.get(l["medicine_id"], 0) + l["quantity"]
+    conn.executemany(
+        "UPDATE medicines SET units_in_stock = units_in_stock + ? WHERE id = ?",
+        [(qty, mid) for mid, qty in units.items()]
+    )
+    sync_medicine_expiry(conn, units)
+
+    return purchase_ids
+
+
+# ==============================
+# 📤 STOCK OUT (FEFO)
+# ==============================
+class StockConflict(Exception):
+    # A guarded update matched fewer rows than planned; the transaction is rolled back
+    pass
+
+
+def lot_stock(conn, medicine_ids, today=None):
+    # {medicine_id: (units in unexpired lots, earliest unexpired lot expiry)}
+    ids = list(medicine_ids)
+    if not ids:
+        return {}
+    rows = conn.execute(f"""
+        SELECT medicine_id, SUM(qty_remaining), MIN(expiry_iso)
+        FROM stock_lots
+        WHERE medicine_id IN ({_placeholders(ids)})
+          AND qty_remaining > 0
+          AND (expiry_iso IS NULL OR expiry_iso >= ?)
+        GROUP BY medicine_id
+    """, ids + [_today_iso(today)]).fetchall()
+    found = {mid: (qty, expiry) for mid, qty, expiry in rows}
+    return {mid: found.get(mid, (0, None)) for mid in ids}
+
+
+def decrement_stock(conn, units, today=None):
+    # units: {medicine_id: quantity}. Takes stock from unexpired lots, FEFO.
+    # Returns {} once everything is deducted, or {medicine_id: units
+    # available} for each medicine that is short, in which case nothing has
+    # been written. Run it inside write_transaction() (BEGIN IMMEDIATE) so
+    # the read and the guarded updates below see the same stock.
+    ids = list(units)
+    if not ids:
+        return {}
+
+    lots = conn.execute(f"""
+        SELECT id, medicine_id, qty_remaining
+        FROM stock_lots
+        WHERE medicine_id IN ({_placeholders(ids)})
+          AND qty_remaining > 0
+          AND (expiry_iso IS NULL OR expiry_iso >= ?)
+        ORDER BY medicine_id, expiry_iso IS NULL, expiry_iso, id
+    """, ids + [_today_iso(today)]).fetchall()
+
+    available = {mid: 0 for mid in ids}
+    for _, mid, qty in lots:
+        available[mid] += qty
+    short = {mid: available[mid] for mid, need in units.items() if need > available[mid]}
+    if short:
+        return short
+
+    remaining = dict(units)
+    taken = []
+    for lot_id, mid, qty in lots:
+        need = remaining[mid]
+        if need <= 0:
+            continue
+        take = min(need, qty)
+        taken.append((take, lot_id, take))
+        remaining[mid] = need - take
+
+    # Never drive a lot or a medicine below zero, whoever else is writing
+    cur = conn.executemany(
+        "UPDATE stock_lots SET qty_remaining = qty_remaining - ? WHERE id = ? AND qty_remaining >= ?",
+        taken
+    )
+    if cur.rowcount != len(taken):
+        raise StockConflict("Lot stock changed during the sale")
+
+    cur = conn.executemany(
+        "UPDATE medicines SET units_in_stock = units_in_stock - ? WHERE id = ? AND units_in_stock >= ?",
+        [(qty, mid, qty) for mid, qty in units.items()]
+    )
+    if cur.rowcount != len(units):
+        raise StockConflict("Medicine stock is lower than its lots; recount before selling")
+    sync_medicine_expiry(conn, ids)
+
+    return {}
@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta
+
+NEAR_EXPIRY_DAYS = 30
+
+# Formats seen in hand-typed and supplier-provided expiry dates, tried in order
+EXPIRY_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+)
+
+
+# ======================================================
+# ---------------- NORMALIZATION -----------------------
+# ======================================================
+def parse_expiry(value):
+    # Canonical ISO 'YYYY-MM-DD' for anything we can read, None otherwise
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+
+    text = str(value).strip()
+    if not text:
+        return None
+    for fmt in EXPIRY_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def lot_expiry(value):
+    # Expiry for a new stock lot: required, since FEFO sells and blocks by it.
+    # Raises ValueError with a message fit to show next to the line.
+    expiry = parse_expiry(value)
+    if expiry is None:
+        if value is None or not str(value).strip():
+            raise ValueError("Missing expiry date")
+        raise ValueError(f"Unreadable expiry date: {value!r}")
+    return expiry
+
+
+def _today_iso(today=None):
+    return (today or date.today()).isoformat()
+
+
+def expiry_status(expiry_iso, today=None, near_days=NEAR_EXPIRY_DAYS):
+    # ISO dates compare correctly as strings, so no parsing on the sale path
+    if not expiry_iso:
+        return None
+    today = today or date.today()
+    if expiry_iso < today.isoformat():
+        return "expired"
+    if expiry_iso <= (today + timedelta(days=near_days)).isoformat():
+        return "near"
+    return None
+
+
+# ======================================================
+# ------------------- QUERIES --------------------------
+# ======================================================
+# Expiry is tracked per lot: only lots that still hold stock are reported,
+# and every range query is served by idx_stock_lots_open_expiry.
+
+LOT_COLUMNS = "name, strength, batch_no, expiry_iso, qty_remaining"
+
+
+def expiring_within(conn, days, columns=LOT_COLUMNS, today=None, include_expired=True):
+    today = today or date.today()
+    limit = (today + timedelta(days=days)).isoformat()
+    lower = "0000-00-00" if include_expired else today.isoformat()
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {columns}
+        FROM open_lots
+        WHERE expiry_iso BETWEEN ? AND ?
+        ORDER BY expiry_iso
+    """, (lower, limit))
+    return cur.fetchall()
+
+
+def already_expired(conn, columns=LOT_COLUMNS, today=None):
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {columns}
+        FROM open_lots
+        WHERE expiry_iso < ?
+        ORDER BY expiry_iso
+    """, (_today_iso(today),))
+    return cur.fetchall()
+
+
+def unreadable_expiry(conn, columns="name, strength, expiry_date"):
+    # Rows whose expiry text could not be normalized; surfaced instead of dropped
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {columns}
+        FROM medicines
+        WHERE expiry_iso IS NULL AND TRIM(COALESCE(expiry_date, '')) != ''
+        ORDER BY name
+    """)
+    return cur.fetchall()
@@ -1,18 +1,279 @@
+import threading
+import time
+
 import streamlit as st
 from twilio.rest import Client
 
+from database import get_connection, write_transaction
+from forecast import reorder_list
+from utils.expiry import expiring_within
 
-def _get_client():
-    return Client(
-        st.secrets["TWILIO_ACCOUNT_SID"],
-        st.secrets["TWILIO_AUTH_TOKEN"]
-    )
+# ======================================================
+# WhatsApp notifications via a persistent outbox
+# ------------------------------------------------------
+# notify() only writes a row to notification_outbox and wakes the worker,
+# so logins and sales never wait on Twilio. A single background thread
+# sends due messages, coalescing everything queued for one recipient into
+# as few WhatsApp messages as possible, and retries failures with
+# exponential backoff. The transport is pluggable (FakeTransport for
+# tests and offline demos).
+# ======================================================
+
+BATCH_SIZE = 50
+MAX_BODY_CHARS = 1500        # WhatsApp caps a message at 1600 characters
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 15 * 60
+POLL_SECONDS = 10
+
+
+# ======================================================
+# ------------------- TRANSPORTS -----------------------
+# ======================================================
+class TwilioTransport:
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        # Built once and reused for every send
+        if self._client is None:
+            self._client = Client(
+                st.secrets["TWILIO_ACCOUNT_SID"],
+                st.secrets["TWILIO_AUTH_TOKEN"]
+            )
+        return self._client
+
+    def send(self, recipient, body):
+        self._get_client().messages.create(
+            from_=st.secrets["TWILIO_WHATSAPP_FROM"],
+            to=recipient or st.secrets["TWILIO_WHATSAPP_TO"],
+            body=body
+        )
+
+
+class FakeTransport:
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+
+    def send(self, recipient, body):
+        if self.fail_times > 0:
+            self.fail_times -= 1
+            raise ConnectionError("fake transport failure")
+        self.sent.append((recipient, body))
+
+
+# ======================================================
+# --------------------- OUTBOX -------------------------
+# ======================================================
+def enqueue(body, recipient=None, kind="message", coalesce_key=None):
+    # With a coalesce_key, a still-pending message with the same key is
+    # replaced instead of queueing a second one (used for digests).
+    with write_transaction(invalidate=False) as conn:
+        replaced = 0
+        if coalesce_key:
+            replaced = conn.execute("""
+                UPDATE notification_outbox
+                SET body = ?, recipient = ?, created_at = CURRENT_TIMESTAMP
+                WHERE coalesce_key = ? AND status = 'pending'
+            """, (body, recipient, coalesce_key)).rowcount
+
+        if not replaced:
+            conn.execute("""
+                INSERT INTO notification_outbox (recipient, body, kind, coalesce_key)
+                VALUES (?, ?, ?, ?)
+            """, (recipient, body, kind, coalesce_key))
+
+    start_worker()
+    _worker.wake()
+
+
+def _backoff(attempts):
+    return min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+
+
+def _split(body):
+    # Pieces of at most MAX_BODY_CHARS, cut at line breaks where possible
+    pieces = []
+    while len(body) > MAX_BODY_CHARS:
+        cut = body.rfind("\n", 0, MAX_BODY_CHARS + 1)
+        if cut <= 0:
+            cut = MAX_BODY_CHARS
+        pieces.append(body[:cut])
+        body = body[cut:].lstrip("\n")
+    pieces.append(body)
+    return pieces
+
+
+def _chunks(rows):
+    # Pack one recipient's messages into bodies of at most MAX_BODY_CHARS;
+    # longer messages are split. Yields (outbox rows in it, body).
+    chunk, parts, size = [], [], 0
+    for row in rows:
+        for piece in _split(row[2]):
+            if parts and size + 1 + len(piece) > MAX_BODY_CHARS:
+                yield chunk, "\n".join(parts)
+                chunk, parts, size = [], [], 0
+            if not chunk or chunk[-1] is not row:
+                chunk.append(row)
+            size += len(piece) + (1 if parts else 0)
+            parts.append(piece)
+    if parts:
+        yield chunk, "\n".join(parts)
+
+
+def flush_outbox(transport, now=None):
+    # Sends every due message once; returns the number of outbox rows sent
+    now = now or time.time()
+
+    conn = get_connection()
+    rows = conn.execute("""
+        SELECT id, recipient, body, attempts
+        FROM notification_outbox
+        WHERE status = 'pending' AND next_attempt_at <= ?
+        ORDER BY id
+        LIMIT ?
+    """, (now, BATCH_SIZE)).fetchall()
+    conn.close()
+
+    if not rows:
+        return 0
+
+    by_recipient = {}
+    for row in rows:
+        by_recipient.setdefault(row[1], []).append(row)
+
+    # A message split over several sends counts as sent only if every part went
+    delivered, failed = set(), {}
+    for recipient, group in by_recipient.items():
+        for chunk, body in _chunks(group):
+            try:
+                transport.send(recipient, body)
+            except Exception as e:
+                for row in chunk:
+                    failed.setdefault(row[0], (row[0], row[3] + 1, str(e)[:500]))
+            else:
+                delivered.update(row[0] for row in chunk)
+    sent = [mid for mid in delivered if mid not in failed]
+    failed = list(failed.values())
 
+    with write_transaction(invalidate=False) as conn:
+        conn.executemany("""
+            UPDATE notification_outbox
+            SET status = 'sent', sent_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [(mid,) for mid in sent])
+        conn.executemany("""
+            UPDATE notification_outbox
+            SET attempts = ?, last_error = ?, next_attempt_at = ?,
+                status = CASE WHEN ? >= ? THEN 'failed' ELSE 'pending' END
+            WHERE id = ?
+        """, [
+            (attempts, error, now + _backoff(attempts), attempts, MAX_ATTEMPTS, mid)
+            for mid, attempts, error in failed
+        ])
 
+    return len(sent)
+
+
+def outbox_status():
+    # {status: count}
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT status, COUNT(*) FROM notification_outbox GROUP BY status"
+    ).fetchall()
+    conn.close()
+    return dict(rows)
+
+
+# ======================================================
+# --------------------- WORKER -------------------------
+# ======================================================
+class OutboxWorker:
+    def __init__(self, transport):
+        self.transport = transport
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="whatsapp-outbox", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = flush_outbox(self.transport)
+            except Exception:
+                sent = 0     # database busy or closed; try again on the next tick
+            if not sent:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+
+_worker = OutboxWorker(TwilioTransport())
+
+
+def set_transport(transport):
+    _worker.transport = transport
+
+
+def start_worker():
+    _worker.start()
+
+
+def stop_worker(timeout=5):
+    _worker.stop(timeout)
+
+
+# ======================================================
+# ---------------------- API ---------------------------
+# ======================================================
 def notify(user, message):
-    client = _get_client()
-    client.messages.create(
-        from_=st.secrets["TWILIO_WHATSAPP_FROM"],
-        to=st.secrets["TWILIO_WHATSAPP_TO"],
-        body=f"{user}: {message}"
+    enqueue(f"{user}: {message}", kind="event")
+
+
+def send_low_stock_digest(threshold=None):
+    # Forecast reorder points unless a fixed threshold is given
+    conn = get_connection()
+    rows = reorder_list(conn, threshold, limit=40)
+    conn.close()
+
+    if not rows:
+        return False
+    lines = "\n".join(
+        f"- {name}: {stock} left" + (f" (~{cover:g} days)" if cover is not None else "")
+        for name, _, stock, _, _, cover in rows
+    )
+    enqueue(f"📉 Low stock digest\n{lines}", kind="digest", coalesce_key="digest:low_stock")
+    return True
+
+
+def send_expiry_digest(days=30):
+    conn = get_connection()
+    rows = expiring_within(conn, days, columns="name, batch_no, expiry_iso, qty_remaining")[:40]
+    conn.close()
+
+    if not rows:
+        return False
+    lines = "\n".join(
+        f"- {name} ({batch or 'no batch'}): {qty} units, expires {expiry}"
+        for name, batch, expiry, qty in rows
     )
+    enqueue(f"⏰ Expiry digest ({days} days)\n{lines}", kind="digest", coalesce_key="digest:expiry")
+    return True
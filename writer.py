@@ -0,0 +1,179 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database import bump_data_version, get_connection, with_busy_retry
+from diagnostics import count
+
+# ======================================================
+# Group-commit writer
+# ------------------------------------------------------
+# Sales and stock movements are handed to one writer thread as commands:
+# callables that take a connection and do their writes. The thread takes
+# every command that queued up meanwhile (lingering a couple of
+# milliseconds for more when the tills are busy), runs the group in a single
+# BEGIN IMMEDIATE ... COMMIT (each command in its own savepoint, so one
+# failing sale does not undo the others) and only then resolves each
+# command's Future. One fsync is shared by the whole group, and because
+# the group commits with synchronous=FULL an acknowledged sale survives a
+# power cut. Commands commit in the order they were submitted.
+#
+# stop_writer() (also run at interpreter exit) finishes everything already
+# queued before returning; later submits are refused.
+# ======================================================
+
+GROUP_WINDOW_SECONDS = 0.002
+MAX_GROUP = 200
+
+_STOP = object()
+
+
+class WriterStopped(Exception):
+    pass
+
+
+class GroupCommitWriter:
+    def __init__(self, window=GROUP_WINDOW_SECONDS, max_group=MAX_GROUP):
+        self.window = window
+        self.max_group = max_group
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.groups = 0
+        self.commands = 0
+        self._last_group = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, command):
+        # Future resolving to command(conn)'s return value once it is committed
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise WriterStopped("The writer has been stopped")
+            self._queue.put((command, future))
+        self.start()
+        return future
+
+    def stop(self, timeout=10):
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ------------------------------
+    def _next_group(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        # Everything that queued up during the previous commit joins this
+        # group. Only when the tills are busy (the last group was shared)
+        # is it worth lingering for stragglers; a lone sale commits at once.
+        group = [first]
+        linger = self.window if self._last_group > 1 else 0
+        deadline = time.monotonic() + linger
+        while len(group) < self.max_group:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return group, True
+            group.append(item)
+        return group, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            group, stopping = self._next_group()
+            group = [(command, future) for command, future in group if future.set_running_or_notify_cancel()]
+            if group:
+                self._commit(group)
+
+    def _commit(self, group):
+        began = time.perf_counter()
+        try:
+            results = with_busy_retry(lambda: self._write(group))
+        except Exception as e:
+            # Nothing from this group was committed
+            for _, future in group:
+                future.set_exception(e)
+            return
+
+        elapsed_ms = (time.perf_counter() - began) * 1000
+        self.groups += 1
+        self.commands += len(group)
+        count("writer.group_commit", elapsed_ms)
+        self._last_group = len(group)
+        for future, value, error in results:
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+
+    def _write(self, group):
+        conn = get_connection()
+        try:
+            conn.execute("PRAGMA synchronous = FULL")
+            conn.execute("BEGIN IMMEDIATE")
+            results = []
+            for command, future in group:
+                conn.execute("SAVEPOINT command")
+                try:
+                    value = command(conn)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO command")
+                    conn.execute("RELEASE command")
+                    results.append((future, None, e))
+                else:
+                    conn.execute("RELEASE command")
+                    results.append((future, value, None))
+            bump_data_version(conn)
+            conn.commit()
+            return results
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.close()
+
+
+_writer = GroupCommitWriter()
+
+
+def submit(command):
+    return _writer.submit(command)
+
+
+def execute(command, timeout=30):
+    # Submit and wait for the commit; re-raises whatever the command raised
+    return _writer.submit(command).result(timeout)
+
+
+def writer_stats():
+    return {"groups": _writer.groups, "commands": _writer.commands}
+
+
+def stop_writer(timeout=10):
+    _writer.stop(timeout)
+
+
+atexit.register(stop_writer)